@@ -1,44 +1,110 @@
 from pathlib import Path
 import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 
-from job_post_collector.job_scroller import SearchConfig, JobScroller
+from job_post_collector.job_scroller import SearchConfig, JobScroller, BrowserProfile, get_chrome_driver
 from job_post_collector.db import DB, DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.driver_pool import ChromeDriverPool
+from job_post_collector.http_scroller import HttpJobScroller
+from job_post_collector.metrics import MetricsExporter
 
 
 search_config_file = Path("./search_configs/config_1_monthly.json")
 
-def main():
-    creds = DB_Creds(
-        host = "localhost",
-        port = '3306',
-        user = "local",
-        password = "local",
-        database = "jobs_data"
-    )
-    
-    db = DB(creds)
-    
+backend = "browser"  # "browser" scrolls the search page in Chrome, "http" requests the result pages without a browser
+max_browsers = 2  # searches run concurrently, each one on its own browser (or http session)
+recycle_browser_after = 10  # searches run on a browser before it is replaced by a fresh one
+browser_profile = BrowserProfile()  # headless, without images, media and fonts
+
+# stage timings and counters, served at http://127.0.0.1:<metrics_port>/metrics and saved every minute to the snapshot file
+metrics_port = 9108
+metrics_snapshot_file = Path("./mount/metrics/collect_by_scrolling_jobs.json")
+
+# the MySQL container of docker-compose.yml, or `SQLite_Creds()` to keep everything in a local file without a server
+creds = DB_Creds(
+    host = "localhost",
+    port = '3306',
+    user = "local",
+    password = "local",
+    database = "jobs_data"
+)
+
+# a DB connection per worker thread, as the mysql connections can't be shared between threads
+thread_local = threading.local()
+
+
+def get_thread_db() -> DB:
+    if not hasattr(thread_local, "db"):
+        thread_local.db = open_db(creds)
+    return thread_local.db
+
+
+def make_scroller(config: SearchConfig, known_jobs: KnownJobsIndex, driver_pool: ChromeDriverPool, job_sink=None) -> JobScroller:
+    if config.backend == "http":
+        return HttpJobScroller(config, get_thread_db(), known_jobs, job_sink=job_sink)
+    return JobScroller(config, get_thread_db(), known_jobs, driver_pool, job_sink=job_sink)
+
+
+def run_search(config: SearchConfig, known_jobs: KnownJobsIndex, driver_pool: ChromeDriverPool, job_sink=None):
+    Scroller = make_scroller(config, known_jobs, driver_pool, job_sink)
+    Scroller.run()
+    return len(Scroller.added_jobs_ids)
+
+
+def load_search_configs() -> list:
     with open(search_config_file, 'r') as f:
         search_config = json.load(f)
         
+    configs = []
     for config in search_config["searches"]:
         
         search_term = config["search_term"]
         location = config["location"]
         last_how_many_days = config["last_how_many_days"]
-        print(f" ||>> Running search for {search_term} in {location} for the last {last_how_many_days} days")
     
-        config = SearchConfig(
-            search_id=f"{search_term}_{datetime.now().strftime('%Y-%m-%d_%H-%M')}",
+        configs.append(SearchConfig(
+            search_id=f"{search_term}_{location}_{datetime.now().strftime('%Y-%m-%d_%H-%M')}",
             Keywords=search_term.replace(" ", "+"),
             Location=location,
-            Time=last_how_many_days*86400
-        )
+            Time=last_how_many_days*86400,
+            max_jobs=config.get("max_jobs", SearchConfig.max_jobs),
+            backend=backend,
+            browser_profile=browser_profile
+        ))
+    return configs
+
+
+def run_searches(configs: list, known_jobs: KnownJobsIndex, job_sink=None):
+    driver_pool = ChromeDriverPool(lambda: get_chrome_driver(browser_profile), size=max_browsers, recycle_after=recycle_browser_after)
+    try:
+        with ThreadPoolExecutor(max_workers=max_browsers) as executor:
+            futures = {executor.submit(run_search, config, known_jobs, driver_pool, job_sink): config for config in configs}
+            for future in as_completed(futures):
+                config = futures[future]
+                try:
+                    print(f" ||>> Finished search for {config.Keywords} in {config.Location} for the last {config.Time // 86400} days: {future.result()} jobs")
+                except Exception as e:
+                    print(f" ||>> Search for {config.Keywords} in {config.Location} failed: {e}")
+    finally:
+        driver_pool.close()
+
+
+def main():
+    db = open_db(creds)
     
-        Scroller = JobScroller(config, db)
-        
-        Scroller.run()
+    # job ids collected by the earlier runs, shared by all the searches below
+    known_jobs = KnownJobsIndex.from_db(db)
+    print(f" ||>> Loaded {len(known_jobs)} already collected job ids")
+    
+    exporter = MetricsExporter(port=metrics_port, snapshot_file=metrics_snapshot_file).start()
+    try:
+        run_searches(load_search_configs(), known_jobs)
+    finally:
+        exporter.stop()
     
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -3,10 +3,18 @@ import json
 from datetime import datetime
 
 from job_post_collector.jd_getter import JD_GetterConfig, JD_Getter
-from job_post_collector.db import DB, DB_Creds
+from job_post_collector.db import DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+from job_post_collector.metrics import MetricsExporter
+
+
+# stage timings and counters, served at http://127.0.0.1:<metrics_port>/metrics and saved every minute to the snapshot file
+metrics_port = 9109
+metrics_snapshot_file = Path("./mount/metrics/collect_jds.json")
 
 
 def main():
+    # or `SQLite_Creds()` for the local SQLite file
     creds = DB_Creds(
         host = "localhost",
         port = '3306',
@@ -15,14 +23,19 @@ def main():
         database = "jobs_data"
     )
     
-    db = DB(creds)
+    db = open_db(creds)
         
     
-    config = JD_GetterConfig()
+    # jobs are leased from the jd_queue table, so several copies of this script can run in parallel
+    config = JD_GetterConfig(mode="queue")
     
     jd_getter = JD_Getter(config, db)
-        
-    jd_getter.run()
+    
+    exporter = MetricsExporter(port=metrics_port, snapshot_file=metrics_snapshot_file).start()
+    try:
+        jd_getter.run()
+    finally:
+        exporter.stop()
     
 if __name__ == "__main__":
     main()
\ No newline at end of file
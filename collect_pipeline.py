@@ -0,0 +1,40 @@
+from pathlib import Path
+
+from job_post_collector.jd_getter import JD_GetterConfig, JD_Getter
+from job_post_collector.sqlite_db import open_db
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.pipeline import ScrollToJDPipeline
+from job_post_collector.metrics import MetricsExporter
+
+from collect_by_scrolling_jobs import creds, load_search_configs, run_searches
+
+
+buffer_size = 200  # jobs waiting for their description before the searches are paused
+
+# a port of its own, so that it can run next to the other collection scripts
+metrics_port = 9110
+metrics_snapshot_file = Path("./mount/metrics/collect_pipeline.json")
+
+
+def main():
+    db = open_db(creds)
+    
+    known_jobs = KnownJobsIndex.from_db(db)
+    print(f" ||>> Loaded {len(known_jobs)} already collected job ids")
+    
+    # the JD stage gets its own connection, as the mysql connections can't be shared between threads
+    jd_getter = JD_Getter(JD_GetterConfig(), open_db(creds))
+    pipeline = ScrollToJDPipeline(jd_getter, buffer_size=buffer_size)
+    pipeline.start()
+    exporter = MetricsExporter(port=metrics_port, snapshot_file=metrics_snapshot_file).start()
+    try:
+        run_searches(load_search_configs(), known_jobs, job_sink=pipeline.sink)
+    finally:
+        print(f" ||>> Searches done, collecting the {pipeline.backlog} buffered job posts")
+        pipeline.stop()
+        exporter.stop()
+        
+    print(f" ||>> Job posts collected: {pipeline.collected}, failed: {pipeline.failed}")
+    
+if __name__ == "__main__":
+    main()
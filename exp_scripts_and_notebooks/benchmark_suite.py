@@ -0,0 +1,315 @@
+# Offline benchmarks of the parsing and DB paths on recorded fixtures, with throughput, peak memory and
+# the change against a saved baseline. Run from the repo root with:
+#   python -m exp_scripts_and_notebooks.benchmark_suite record       # copies saved search pages and cached job pages into the fixtures
+#   python -m exp_scripts_and_notebooks.benchmark_suite synthesize   # or generates synthetic ones, when nothing was recorded yet
+#   python -m exp_scripts_and_notebooks.benchmark_suite run [--db [sqlite|mysql]] [--save-baseline]
+# `--db` also runs the DB benchmarks on a scratch SQLite file, `--db mysql` on the local MySQL container
+# (the rows it writes are deleted afterwards from every table).
+import argparse
+import gc
+import gzip
+import json
+import logging
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+from bs4 import BeautifulSoup
+
+from job_post_collector.jd_getter import JD_Getter, JD_GetterConfig, extract_job_tags_single_pass, make_job_data
+from job_post_collector.job_scroller import SearchConfig
+from job_post_collector.http_scroller import HttpJobScroller
+from job_post_collector.page_cache import RawPageCache
+from job_post_collector.db import DB, DB_Creds
+from job_post_collector.sqlite_db import SQLiteDB, SQLite_Creds
+from exp_scripts_and_notebooks.db_insert_benchmark import delete_benchmark_rows
+
+
+fixtures_dir = Path("./mount/benchmark_fixtures")
+results_dir = Path("./mount/benchmark_results")
+baseline_file = results_dir / "baseline.json"
+
+search_snapshots_dir = Path("./mount/scrape_scroll_saves")  # written by the scrollers with `save_html_snapshots=True`
+jd_page_cache_dir = Path("./mount/jd_page_cache")
+
+search_page_sizes = [25, 100, 500]  # cards per synthetic search page
+n_jd_pages = 200
+repeat = 5  # the fastest of these many passes is reported
+min_pass_seconds = 0.5
+
+# a benchmark is flagged when its throughput drops or its peak memory grows by more than this
+regression_threshold_pct = 10
+
+
+def search_pages_dir() -> Path:
+    return fixtures_dir / "search_pages"
+
+
+def jd_pages_dir() -> Path:
+    return fixtures_dir / "jd_pages"
+
+
+def write_fixture(path: Path, content: bytes):
+    os.makedirs(path.parent, exist_ok=True)
+    with gzip.open(path, "wb") as file:
+        file.write(content)
+
+
+def load_fixtures(folder: Path) -> dict:
+    return {path.name[:-len(".html.gz")]: gzip.decompress(path.read_bytes()) for path in sorted(folder.glob("*.html.gz"))}
+
+
+def record():
+    recorded = 0
+    for path in sorted(search_snapshots_dir.glob("*.html")):
+        write_fixture(search_pages_dir() / f"{path.stem}.html.gz", path.read_bytes())
+        recorded += 1
+    print(f"Recorded {recorded} search pages from {search_snapshots_dir}")
+
+    cache = RawPageCache(jd_page_cache_dir)
+    records = list(cache.iter_latest())
+    random.Random(0).shuffle(records)
+    for record in records[:n_jd_pages]:
+        write_fixture(jd_pages_dir() / f"{record['job_id']}.html.gz", cache.get(record["sha256"]))
+    print(f"Recorded {min(len(records), n_jd_pages)} job pages from {jd_page_cache_dir}")
+
+
+def synthetic_card(i: int) -> str:
+    return f"""<li><div class="base-card relative job-search-card" data-entity-urn="urn:li:jobPosting:{i}">
+<a class="base-card__full-link" href="https://in.linkedin.com/jobs/view/data-scientist-at-company-{i % 97}-{4000000000 + i}?position={i}&amp;pageNum=0">
+<span class="sr-only">Data Scientist {i}</span></a>
+<div class="base-search-card__info"><h3 class="base-search-card__title">Data Scientist {i}</h3>
+<h4 class="base-search-card__subtitle"><a class="hidden-nested-link">Company {i % 97}</a></h4>
+<div class="base-search-card__metadata"><span class="job-search-card__location">Bengaluru, Karnataka, India</span>
+<time class="job-search-card__listdate" datetime="2024-01-01">{i % 30 + 1} days ago</time></div></div></div></li>"""
+
+
+def synthetic_jd_page(i: int) -> bytes:
+    paragraphs = "".join([f"<p>Responsibility {j}: build and maintain models for problem {i}-{j}.</p>" for j in range(20)])
+    similar = "".join([f'<li><div class="base-card"><h3 class="base-main-card__title">Similar job {j}</h3><span>Company {j}</span></div></li>' for j in range(30)])
+    return f"""<!DOCTYPE html><html><head><link rel="canonical" href="https://in.linkedin.com/jobs/view/{4000000000 + i}">
+<script>window.data = {{"items": [{", ".join(str(j) for j in range(200))}]}};</script><style>.a{{color:red}}</style></head>
+<body><main><section class="description"><div class="{"show-more-less-html__markup show-more-less-html__markup--clamp-after-5 relative overflow-hidden"}">
+{paragraphs}</div>
+<ul class="description__job-criteria-list">
+<li class="description__job-criteria-item"><h3 class="description__job-criteria-subheader">Seniority level</h3><span class="description__job-criteria-text">Mid-Senior level</span></li>
+<li class="description__job-criteria-item"><h3 class="description__job-criteria-subheader">Employment type</h3><span class="description__job-criteria-text">Full-time</span></li>
+<li class="description__job-criteria-item"><h3 class="description__job-criteria-subheader">Job function</h3><span class="description__job-criteria-text">Engineering</span></li>
+<li class="description__job-criteria-item"><h3 class="description__job-criteria-subheader">Industries</h3><span class="description__job-criteria-text">Software Development</span></li>
+</ul></section><section class="similar-jobs"><ul>{similar}</ul></section></main></body></html>""".encode()
+
+
+def synthesize():
+    for size in search_page_sizes:
+        cards = "".join([synthetic_card(i) for i in range(size)])
+        page = f'<!DOCTYPE html><html><head><script>var x = "<div>";</script></head><body><ul class="jobs-search__results-list">{cards}</ul></body></html>'
+        write_fixture(search_pages_dir() / f"synthetic_{size}_cards.html.gz", page.encode())
+    for i in range(n_jd_pages):
+        write_fixture(jd_pages_dir() / f"synthetic_{i}.html.gz", synthetic_jd_page(i))
+    print(f"Synthetic fixtures written to {fixtures_dir}")
+
+
+def timed_pass(func, items: list, loops: int) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(loops):
+        for item in items:
+            func(item)
+    return time.perf_counter() - start
+
+
+def measure(func, items: list) -> dict:
+    # throughput on the fastest of `repeat` passes, each one long enough (`min_pass_seconds`) to even out the timer noise,
+    # then the peak memory on one more pass under tracemalloc
+    first = timed_pass(func, items, 1)
+    loops = max(1, math.ceil(min_pass_seconds / first)) if first else 1
+    best = min([timed_pass(func, items, loops) for _ in range(repeat)]) / loops
+
+    gc.collect()
+    tracemalloc.start()
+    for item in items:
+        func(item)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "items": len(items),
+        "per_second": len(items) / best if best else 0.0,
+        "ms_per_item": 1000 * best / len(items),
+        "peak_kib": peak / 1024,
+    }
+
+
+def parse_benchmarks(log_dir: str) -> dict:
+    results = {}
+
+    search_pages = load_fixtures(search_pages_dir())
+    if search_pages:
+        # the http scroller parses the same way as the browser one, without starting a browser
+        scroller = HttpJobScroller(SearchConfig(search_id="benchmark", card_log=False, base_save_dir=log_dir, log_dir=log_dir), db=None)
+        scroller.logger.logger.removeHandler(scroller.log_handler)
+        scroller.log_handler.close()
+        quiet_logger = logging.getLogger("job_scroller.benchmark")
+        quiet_logger.disabled = True
+        scroller.logger = logging.LoggerAdapter(quiet_logger, {"search_id": "benchmark"})
+        for name, page in search_pages.items():
+            results[f"scrape_job_info_from_html[{name}]"] = measure(scroller.scrape_job_info_from_html, [page.decode("utf-8", errors="replace")])
+
+    jd_pages = list(load_fixtures(jd_pages_dir()).values())
+    if jd_pages:
+        for name, config in {
+            "full": JD_GetterConfig(fast_parse=False, log_dir=log_dir, page_cache_dir=None),
+            "fast": JD_GetterConfig(fast_parse=True, log_dir=log_dir, page_cache_dir=None),
+        }.items():
+            jd_getter = JD_Getter(config, db=None)
+
+            def parse(content: bytes):
+                try:
+                    jd_getter.parse_job_page(content, "fixture")
+                except ValueError:
+                    pass
+            results[f"parse_job_page[{name}]"] = measure(parse, jd_pages)
+
+        soups = [BeautifulSoup(content, "html.parser") for content in jd_pages]
+        results["extract_job_tags"] = measure(jd_getter.extract_job_tags, soups)
+        results["extract_job_tags_single_pass"] = measure(extract_job_tags_single_pass, soups)
+
+    return results
+
+
+def db_benchmarks(backend: str = "sqlite", n_rows: int = 2000) -> dict:
+    scratch_dir = None
+    if backend == "mysql":
+        creds = DB_Creds(
+            host = "localhost",
+            port = '3306',
+            user = "local",
+            password = "local",
+            database = "jobs_data"
+        )
+        db = DB(creds)
+    else:
+        # a throwaway file with the schema fully migrated, nothing reaches the collection DB
+        scratch_dir = tempfile.mkdtemp()
+        db = SQLiteDB(SQLite_Creds(path=os.path.join(scratch_dir, "benchmark.sqlite3")))
+        db.migrate_schema()
+
+    tag = f"__benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+    scrolled_rows = [
+        {
+            "job_title": f"Job {i}", "company": f"Company {i % 50}", "location": "India", "time_of_posting": "1 day ago",
+            "job_link": f"https://in.linkedin.com/jobs/view/{tag}-{i}", "job_id": f"{tag}-{i}",
+            "search_keyword": tag, "search_location": "India"
+        }
+        for i in range(n_rows)
+    ]
+    description = {"job_description": "lorem ipsum " * 300, "Seniority level": "Mid-Senior level", "Employment type": "Full-time",
+                   "Job function": "Engineering", "Industries": "Software Development"}
+    job_rows = [make_job_data(f"{tag}-{i}", f"https://in.linkedin.com/jobs/view/{tag}-{i}", description) for i in range(n_rows)]
+
+    def cleanup():
+        if scratch_dir is None:
+            delete_benchmark_rows(db, f"{tag}-", tag)
+        db.db.close()
+        if scratch_dir is not None:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+    results = {}
+    try:
+        # a single pass each, as the rows are only inserted once
+        for name, func in [
+            ("insert_scrolled_jobs", lambda: db.insert_scrolled_jobs(scrolled_rows)),
+            ("insert_job (per row)", lambda: [db.insert_job(row) for row in job_rows[:n_rows // 2]]),
+            ("insert_jobs (bulk)", lambda: db.insert_jobs(job_rows[n_rows // 2:])),
+        ]:
+            start = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - start
+            items = n_rows // 2 if "insert_job" in name else n_rows
+            results[f"{name} [{backend}]"] = {"items": items, "per_second": items / elapsed, "ms_per_item": 1000 * elapsed / items, "peak_kib": None}
+
+        rows = sum(1 for _ in db.iter_scrolled_job_ids())
+        results[f"iter_scrolled_job_ids[{rows} rows] [{backend}]"] = measure(lambda _: sum(1 for _ in db.iter_scrolled_job_ids()), [None])
+        results[f"iter_scrolled_job_ids[{rows} rows] [{backend}]"]["items"] = rows
+        results[f"get_all_scrolled_jobs [{backend}]"] = measure(lambda _: db.get_all_scrolled_jobs(), [None])
+        lookups = [row["job_id"] for row in scrolled_rows[:200]] + [f"{tag}-missing-{i}" for i in range(200)]
+        results[f"check_if_job_already_scraped [{backend}]"] = measure(db.check_if_job_already_scraped, lookups)
+    finally:
+        cleanup()
+    return results
+
+
+def compare(results: dict, baseline: dict) -> bool:
+    regressed = False
+    print(f"{'benchmark':55s} {'items/s':>12s} {'ms/item':>10s} {'peak KiB':>10s} {'vs baseline':>24s}")
+    for name, result in results.items():
+        peak = f"{result['peak_kib']:10.1f}" if result["peak_kib"] is not None else f"{'-':>10s}"
+        delta = ""
+        if name in baseline:
+            before = baseline[name]
+            speed = 100 * (result["per_second"] / before["per_second"] - 1)
+            delta = f"{speed:+.1f}% speed"
+            flagged = speed < -regression_threshold_pct
+            if result["peak_kib"] is not None and before.get("peak_kib"):
+                memory = 100 * (result["peak_kib"] / before["peak_kib"] - 1)
+                delta += f", {memory:+.1f}% mem"
+                flagged = flagged or memory > regression_threshold_pct
+            if flagged:
+                delta += "  REGRESSION"
+                regressed = True
+        print(f"{name:55s} {result['per_second']:12.1f} {result['ms_per_item']:10.3f} {peak} {delta:>24s}")
+    return regressed
+
+
+def run(db_backend: str, save_baseline: bool) -> int:
+    log_dir = tempfile.mkdtemp()
+    results = parse_benchmarks(log_dir)
+    if not results:
+        print(f"No fixtures found in {fixtures_dir}, run the record or synthesize command first")
+        return 1
+    if db_backend:
+        results.update(db_benchmarks(db_backend))
+
+    baseline = {}
+    if baseline_file.exists():
+        with open(baseline_file, "r", encoding="utf-8") as file:
+            baseline = json.load(file)["results"]
+    regressed = compare(results, baseline)
+
+    os.makedirs(results_dir, exist_ok=True)
+    report = {"created_at": datetime.now().isoformat(timespec="seconds"), "python": sys.version.split()[0], "results": results}
+    result_file = results_dir / f"{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.json"
+    for path in [result_file] + ([baseline_file] if save_baseline else []):
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=4)
+    print(f"Results saved to {result_file}" + (f" and {baseline_file}" if save_baseline else ""))
+    return 1 if regressed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("record", help="copy the saved search pages and cached job pages into the fixtures")
+    subparsers.add_parser("synthesize", help="generate synthetic fixtures")
+    run_parser = subparsers.add_parser("run", help="run the benchmarks")
+    run_parser.add_argument("--db", nargs="?", const="sqlite", choices=["sqlite", "mysql"],
+                            help="also benchmark the DB paths, on a scratch SQLite file (default) or the local MySQL")
+    run_parser.add_argument("--save-baseline", action="store_true", help="use these results as the baseline of the next runs")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record()
+    elif args.command == "synthesize":
+        synthesize()
+    else:
+        sys.exit(run(args.db, args.save_baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+# Throughput comparison of the per-row and the bulk insert paths of `DB` on synthetic scrolled jobs.
+# Needs the local MySQL container running. Run from the repo root with:
+#   python -m exp_scripts_and_notebooks.db_insert_benchmark
+import time
+from datetime import datetime
+
+from job_post_collector.db import DB, DB_Creds
+
+
+n_rows = 5000
+benchmark_keyword = f"__insert_benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def make_rows(tag: str):
+    return [
+        {
+            "job_title": f"Job {i}",
+            "company": f"Company {i % 50}",
+            "location": "India",
+            "time_of_posting": "1 day ago",
+            "job_link": f"https://in.linkedin.com/jobs/view/{benchmark_keyword}-{tag}-{i}",
+            "job_id": f"{benchmark_keyword}-{tag}-{i}",
+            "search_keyword": benchmark_keyword,
+            "search_location": "India"
+        }
+        for i in range(n_rows)
+    ]
+
+
+def delete_benchmark_rows(db: DB, job_id_prefix: str, search_keyword: str):
+    # from every table the inserts write to, so that no fake job is left for the JD collector to fetch
+    pattern = f"{job_id_prefix}%"
+    cursor = db.db.cursor()
+    if db.schema_version >= 2:
+        cursor.execute("DELETE FROM job_sightings WHERE job_ref IN (SELECT id FROM jobs_seen WHERE job_id LIKE %s)", (pattern,))
+        cursor.execute("DELETE FROM jobs_seen WHERE job_id LIKE %s", (pattern,))
+        cursor.execute("DELETE FROM searches WHERE search_keyword = %s", (search_keyword,))
+    cursor.execute("DELETE FROM scrolled_jobs WHERE job_id LIKE %s OR search_keyword = %s", (pattern, search_keyword))
+    cursor.execute("DELETE FROM jobs WHERE job_id LIKE %s", (pattern,))
+    cursor.execute("DELETE FROM jd_queue WHERE job_id LIKE %s", (pattern,))
+    db.db.commit()
+    cursor.close()
+
+
+def cleanup(db: DB):
+    delete_benchmark_rows(db, benchmark_keyword, benchmark_keyword)
+
+
+def main():
+    creds = DB_Creds(
+        host = "localhost",
+        port = '3306',
+        user = "local",
+        password = "local",
+        database = "jobs_data"
+    )
+    
+    db = DB(creds)
+    
+    try:
+        rows = make_rows("per-row")
+        start = time.perf_counter()
+        for row in rows:
+            db.insert_scrolled_job(row)
+        per_row_time = time.perf_counter() - start
+        
+        rows = make_rows("bulk")
+        start = time.perf_counter()
+        db.insert_scrolled_jobs(rows)
+        bulk_time = time.perf_counter() - start
+        
+        # re-inserting the same rows exercises the duplicate rejection of the unique key
+        start = time.perf_counter()
+        inserted = db.insert_scrolled_jobs(rows)
+        duplicate_time = time.perf_counter() - start
+    finally:
+        cleanup(db)
+    
+    print(f"per-row insert : {n_rows / per_row_time:10.1f} rows/s ({per_row_time:.2f}s)")
+    print(f"bulk insert    : {n_rows / bulk_time:10.1f} rows/s ({bulk_time:.2f}s)")
+    print(f"bulk duplicates: {n_rows / duplicate_time:10.1f} rows/s ({duplicate_time:.2f}s, {inserted} rows inserted)")
+    print(f"speedup        : {per_row_time / bulk_time:.1f}x")
+    
+
+if __name__ == "__main__":
+    main()
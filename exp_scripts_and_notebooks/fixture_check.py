@@ -0,0 +1,302 @@
+# End-to-end check of the collectors against the local `fixture_server.py`, each run on a scratch SQLite file,
+# so the network paths (pacing, retries, throttling, the queue, the search paging) can be rerun without reaching LinkedIn,
+# and of the full-text search queries over the collected descriptions. Run from the repo root with:
+#   python -m exp_scripts_and_notebooks.fixture_check [--jd-modes sequential concurrent queue] [--skip-search] [--skip-scheduler]
+# Exits with 1 when a check fails.
+import argparse
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import List
+
+from job_post_collector.jd_getter import JD_Getter, JD_GetterConfig, make_job_data
+from job_post_collector.job_scroller import SearchConfig
+from job_post_collector.http_scroller import HttpJobScroller
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.scheduler import ScheduledSearch, SearchScheduler, WatermarkStore
+from job_post_collector.pacing import AdaptivePacer
+from job_post_collector.sqlite_db import SQLiteDB, SQLite_Creds
+from exp_scripts_and_notebooks.fixture_server import FixtureServer
+from schedule_searches import make_search_config
+
+
+n_jobs = 20
+search_keyword = "__fixture_check"
+n_search_results = 35
+
+
+def scratch_db(scratch_dir: str) -> SQLiteDB:
+    db = SQLiteDB(SQLite_Creds(path=os.path.join(scratch_dir, "fixture_check.sqlite3")))
+    db.migrate_schema()
+    return db
+
+
+def scrolled_row(job_id: str, job_link: str) -> dict:
+    return {
+        "job_title": f"Job {job_id}", "company": "Company", "location": "India", "time_of_posting": "1 day ago",
+        "job_link": job_link, "job_id": job_id, "search_keyword": search_keyword, "search_location": "India"
+    }
+
+
+def close_log_handlers(log_dir: str):
+    # the collectors add file handlers to shared loggers, the ones writing into the scratch folder go with it
+    log_dir = os.path.abspath(log_dir)
+    for logger in [logging.getLogger(name) for name in logging.root.manager.loggerDict] + [logging.root]:
+        if not isinstance(logger, logging.Logger):
+            continue
+        for handler in list(logger.handlers):
+            if isinstance(handler, logging.FileHandler) and handler.baseFilename.startswith(log_dir):
+                logger.removeHandler(handler)
+                handler.close()
+
+
+def check_jd_getter(mode: str) -> List[str]:
+    problems = []
+    scratch_dir = tempfile.mkdtemp()
+    db = scratch_db(scratch_dir)
+    try:
+        with FixtureServer() as server:
+            collected_ids = [str(i) for i in range(n_jobs)] + ["throttled-0"]
+            failed_ids = ["error-0", "missing-0"]
+            db.insert_scrolled_jobs([scrolled_row(job_id, server.job_link(job_id)) for job_id in collected_ids + failed_ids])
+
+            # the pacing and retry delays are scaled down, the server answers in a few milliseconds
+            config = JD_GetterConfig(mode=mode, wait_time=0.01, retry_wait_time=0.1, min_rate=1, max_rate=100, max_backoff=1,
+                                     page_cache_dir=None, log_dir=scratch_dir)
+            jd_getter = JD_Getter(config, db)
+            start = time.perf_counter()
+            jd_getter.run()
+            elapsed = time.perf_counter() - start
+            jd_getter.http.close()
+
+            cursor = db.db.cursor()
+            cursor.execute("SELECT job_id, job_description, seniority_level FROM jobs")
+            rows = {job_id: (description, seniority_level) for job_id, description, seniority_level in cursor.fetchall()}
+            cursor.close()
+
+            if sorted(rows) != sorted(collected_ids):
+                problems.append(f"stored {sorted(rows)}, expected {sorted(collected_ids)}")
+            for job_id, (description, seniority_level) in rows.items():
+                if "Responsibility" not in (description or "") or seniority_level != "Mid-Senior level":
+                    problems.append(f"job {job_id} stored as {description!r:.60} / {seniority_level!r}")
+            if server.hits["/jobs/view/throttled-0"] != 2:
+                problems.append(f"the throttled page was requested {server.hits['/jobs/view/throttled-0']} times, expected 2")
+            if server.hits["/jobs/view/error-0"] != config.max_retries:
+                problems.append(f"the failing page was requested {server.hits['/jobs/view/error-0']} times, expected {config.max_retries}")
+            if mode == "queue":
+                counts = db.get_jd_queue_counts()
+                if counts["done"] != len(collected_ids) or counts["failed_permanent"] != len(failed_ids):
+                    problems.append(f"queue state {counts}")
+            print(f"JD_Getter[{mode}]: {len(rows)} jobs stored in {elapsed:.1f}s, {sum(server.hits.values())} requests")
+    finally:
+        close_log_handlers(scratch_dir)
+        db.db.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return problems
+
+
+def count_rows(db: SQLiteDB, table: str) -> int:
+    cursor = db.db.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    count = cursor.fetchone()[0]
+    cursor.close()
+    return count
+
+
+def check_http_scroller() -> List[str]:
+    # two searches returning the same jobs: the first stores their cards, the second only its sightings of them
+    problems = []
+    scratch_dir = tempfile.mkdtemp()
+    db = scratch_db(scratch_dir)
+    try:
+        with FixtureServer(n_search_results=n_search_results) as server:
+            known_jobs = KnownJobsIndex.from_db(db)
+            searches = [f"{search_keyword} {i}" for i in range(2)]
+            start = time.perf_counter()
+            for i, keyword in enumerate(searches):
+                config = SearchConfig(search_id=f"fixture_check_{i}", Keywords=keyword, backend="http", api_base_url=server.search_url,
+                                      base_save_dir=scratch_dir, log_dir=scratch_dir, min_wait_interval=0.01, max_wait_timeout=0.1, stop_after_stale_batches=0)
+                scroller = HttpJobScroller(config, db, known_jobs)
+                scroller.run()
+                scroller.http.close()
+                if scroller.outcome != "reached_end":
+                    problems.append(f"search {keyword!r} ended as {scroller.outcome}")
+            elapsed = time.perf_counter() - start
+
+            # the second page of each search is throttled once, then fetched again
+            second_page = sum([hits for path, hits in server.hits.items() if path.endswith(f"&start={server.search_page_size}")])
+            if second_page != 2 * len(searches):
+                problems.append(f"the second search pages were requested {second_page} times, expected {2 * len(searches)}")
+
+            counts = {table: count_rows(db, table) for table in ["scrolled_jobs", "jobs_seen", "job_sightings"]}
+            expected = {"scrolled_jobs": n_search_results, "jobs_seen": n_search_results, "job_sightings": n_search_results * len(searches)}
+            if counts != expected:
+                problems.append(f"stored {counts}, expected {expected}")
+            pending = len(list(db.get_pending_jobs()))
+            if pending != n_search_results:
+                problems.append(f"{pending} jobs pending for the JD collector, expected {n_search_results}")
+            print(f"HttpJobScroller: {len(searches)} searches in {elapsed:.1f}s, {sum(server.hits.values())} requests, stored {counts}")
+    finally:
+        close_log_handlers(scratch_dir)
+        db.db.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return problems
+
+
+def check_scheduler() -> List[str]:
+    # "earlier" was already run outside the scheduler, so its first watermark comes from its latest sighting,
+    # "known" only finds jobs already known (a run stopping on stale batches would end short of its window),
+    # "capped" stops at max_jobs, so its watermark stays put and the next run asks for the same window again
+    problems = []
+    scratch_dir = tempfile.mkdtemp()
+    db = scratch_db(scratch_dir)
+    try:
+        with FixtureServer(n_search_results=n_search_results) as server:
+            known_jobs = KnownJobsIndex.from_db(db)
+            searches = {name: ScheduledSearch(f"{search_keyword} {name}", "India", max_window_days=30, max_jobs=max_jobs)
+                        for name, max_jobs in [("earlier", 400), ("known", 400), ("capped", 5)]}
+
+            def run_search(search: ScheduledSearch, window_seconds: int) -> str:
+                config = make_search_config(search, window_seconds, backend="http", api_base_url=server.search_url, card_log=False,
+                                            base_save_dir=scratch_dir, log_dir=scratch_dir, min_wait_interval=0.01, max_wait_timeout=0.1)
+                scroller = HttpJobScroller(config, db, known_jobs)
+                scroller.run()
+                scroller.http.close()
+                outcomes[search.key] = scroller.outcome
+                return scroller.outcome
+
+            outcomes = {}
+            run_search(searches["earlier"], 86400)
+            watermarks = WatermarkStore(os.path.join(scratch_dir, "watermarks.json"))
+            scheduler = SearchScheduler(list(searches.values()), run_search, watermarks,
+                                        last_seen=lambda search: db.get_last_sighting(search.search_keyword, search.location),
+                                        max_concurrent=1)
+            max_window = 30 * 86400
+            first_windows = {name: scheduler.window_for(search, datetime.now()) for name, search in searches.items()}
+            if not first_windows["earlier"] < max_window or first_windows["known"] != max_window:
+                problems.append(f"first windows {first_windows}, expected a narrow one for 'earlier' only")
+
+            # one at a time, as the searches share the DB connection
+            while scheduler.start_due_searches():
+                scheduler.stop()
+                scheduler.stop_event.clear()
+
+            expected = {"earlier": "reached_end", "known": "reached_end", "capped": "cut_short"}
+            for name, search in searches.items():
+                if outcomes.get(search.key) != expected[name]:
+                    problems.append(f"search {name!r} ended as {outcomes.get(search.key)}, expected {expected[name]}")
+            next_windows = {name: scheduler.window_for(search, datetime.now()) for name, search in searches.items()}
+            if next_windows["earlier"] >= max_window or next_windows["known"] >= max_window or next_windows["capped"] != max_window:
+                problems.append(f"next windows {next_windows}, expected the full window for 'capped' only")
+            if watermarks.get(searches["capped"].key) is not None:
+                problems.append("the watermark of the search cut short was moved")
+            print(f"SearchScheduler: outcomes {outcomes}, next windows (hours) { {name: window // 3600 for name, window in next_windows.items()} }")
+    finally:
+        close_log_handlers(scratch_dir)
+        db.db.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return problems
+
+
+def check_pacer(n_workers: int = 8) -> List[str]:
+    # the requests of several workers in flight when the server starts throttling: the pacer slows down once for all of them
+    problems = []
+    pacer = AdaptivePacer(initial_rate=100, min_rate=0.1, max_rate=100, base_backoff=0.2, max_backoff=1)
+    in_flight = threading.Barrier(n_workers)
+
+    def request():
+        started_at = pacer.wait()
+        in_flight.wait()
+        pacer.on_throttle(started_at=started_at)
+
+    workers = [threading.Thread(target=request) for _ in range(n_workers)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    state = pacer.state()
+    if state["rate"] != 50 or state["consecutive_throttles"] != 1 or state["total_throttles"] != n_workers:
+        problems.append(f"after {n_workers} simultaneous throttles the pacer is at {state}, expected a single decrease to 50/s")
+
+    # a request let through after the backoff and throttled again is a new throttle
+    pacer.on_throttle(started_at=pacer.wait())
+    state = pacer.state()
+    if state["rate"] != 25 or state["consecutive_throttles"] != 2:
+        problems.append(f"after a later throttle the pacer is at {state}, expected a second decrease to 25/s")
+    print(f"AdaptivePacer: {n_workers} simultaneous throttles and a later one, pacing: {state}")
+    return problems
+
+
+# query -> ids of the descriptions below it should match, None when it should be rejected
+SEARCH_DESCRIPTIONS = {
+    "spark": "Python developer working with Spark",
+    "java": "Python and Java developer",
+    "scala": "Python services, some Scala",
+    "java_only": "Java developer",
+}
+SEARCH_QUERIES = {
+    "python": ["spark", "java", "scala"],
+    "python -(java scala)": ["spark"],
+    "python NOT (java scala)": ["spark"],
+    "python (java OR scala)": ["java", "scala"],
+    "java -python": ["java_only"],
+    "python (spark": None,
+    "(a (b c))": None,
+    "python - java": None,
+    "python (spark -java)": None,
+}
+
+
+def check_search_queries() -> List[str]:
+    problems = []
+    scratch_dir = tempfile.mkdtemp()
+    db = scratch_db(scratch_dir)
+    try:
+        db.insert_jobs([make_job_data(job_id, f"https://example.com/{job_id}", {"job_description": description})
+                        for job_id, description in SEARCH_DESCRIPTIONS.items()])
+        for query, expected in SEARCH_QUERIES.items():
+            try:
+                found = sorted([match.job_id for match in db.search_jobs(query)])
+            except ValueError:
+                found = None
+            if found != (sorted(expected) if expected is not None else None):
+                problems.append(f"search {query!r} found {'nothing, it was rejected' if found is None else found}, "
+                                f"expected {'it to be rejected' if expected is None else expected}")
+        print(f"search_jobs: {len(SEARCH_QUERIES)} queries checked")
+    finally:
+        db.db.close()
+        shutil.rmtree(scratch_dir, ignore_errors=True)
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jd-modes", nargs="*", default=["sequential", "concurrent", "queue"],
+                        choices=["sequential", "concurrent", "queue"], help="JD_Getter modes to check")
+    parser.add_argument("--skip-search", action="store_true", help="do not check the http job scroller")
+    parser.add_argument("--skip-scheduler", action="store_true", help="do not check the search scheduler")
+    args = parser.parse_args()
+
+    checks = [lambda mode=mode: check_jd_getter(mode) for mode in args.jd_modes]
+    if not args.skip_search:
+        checks.append(check_http_scroller)
+    if not args.skip_scheduler:
+        checks.append(check_scheduler)
+    checks += [check_pacer, check_search_queries]
+    failed = False
+    for check in checks:
+        problems = check()
+        for problem in problems:
+            print(f"  FAILED: {problem}")
+        failed = failed or bool(problems)
+    print("Some checks failed" if failed else "All checks passed")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
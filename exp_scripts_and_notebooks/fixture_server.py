@@ -0,0 +1,142 @@
+# Local HTTP server standing in for the job pages and the search results, so the collectors can be checked end to end
+# without the network. Serves the synthetic pages of the benchmark suite at `/jobs/view/<job_id>`, where the job id picks the response:
+#   <n>            a job page (the description and the criteria list)
+#   throttled-<n>  429 with `Retry-After: 1` on the first request, the job page afterwards
+#   error-<n>      500 on every request
+#   missing-<n>    a page without a job post
+# and the search result fragments (`SearchConfig.api_base_url`) at `/search?...&start=<n>`: `search_page_size` job cards
+# from the n-th of `n_search_results`, an empty fragment past the end. The second page of each search is throttled once.
+# Used by `fixture_check.py`, or on its own with:
+#   python -m exp_scripts_and_notebooks.fixture_server [port]
+import sys
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from exp_scripts_and_notebooks.benchmark_suite import synthetic_card, synthetic_jd_page
+
+
+MISSING_PAGE = b"<!DOCTYPE html><html><head></head><body><main><h1>This job is no longer available</h1></main></body></html>"
+
+
+class _FixtureHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        path = url.path
+        with self.server.lock:
+            self.server.hits[self.path] += 1
+            hits = self.server.hits[self.path]
+
+        if path == "/search":
+            return self._send_search_page(parse_qs(url.query), hits)
+        if not path.startswith("/jobs/view/"):
+            return self._send(404, b"")
+        job_id = path[len("/jobs/view/"):]
+        kind, _, number = job_id.rpartition("-")
+        if not number.isdigit():
+            return self._send(404, b"")
+        if kind == "error":
+            return self._send(500, b"")
+        if kind == "throttled" and hits == 1:
+            return self._send(429, b"", {"Retry-After": "1"})
+        if kind == "missing":
+            return self._send(200, MISSING_PAGE)
+        self._send(200, synthetic_jd_page(int(number)))
+
+
+    def _send_search_page(self, query: dict, hits: int):
+        try:
+            start = int(query.get("start", ["0"])[0])
+        except ValueError:
+            return self._send(400, b"")
+        page_size = self.server.search_page_size
+        if start == page_size and hits == 1:
+            return self._send(429, b"", {"Retry-After": "1"})
+        cards = [synthetic_card(i) for i in range(start, min(start + page_size, self.server.n_search_results))]
+        self._send(200, "".join(cards).encode())
+
+
+    def _send(self, status: int, body: bytes, headers: dict = None):
+        self.send_response(status)
+        for name, value in {"Content-Type": "text/html; charset=utf-8", "Content-Length": str(len(body)), **(headers or {})}.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    def __init__(self, port: int = 0, n_search_results: int = 35, search_page_size: int = 10):
+
+        # port 0 picks a free one, see `base_url`
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), _FixtureHandler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.hits = Counter()
+        self.server.n_search_results = n_search_results
+        self.server.search_page_size = search_page_size
+        self.thread = None
+
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+
+    @property
+    def hits(self) -> Counter:
+        # requests received per path (with its query string)
+        return self.server.hits
+
+
+    @property
+    def search_page_size(self) -> int:
+        return self.server.search_page_size
+
+
+    @property
+    def search_url(self) -> str:
+        # for `SearchConfig.api_base_url`
+        return f"{self.base_url}/search?"
+
+
+    def job_link(self, job_id: str) -> str:
+        return f"{self.base_url}/jobs/view/{job_id}"
+
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+    def __enter__(self):
+        return self.start()
+
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    server = FixtureServer(int(sys.argv[1]) if len(sys.argv) > 1 else 8765)
+    print(f"Serving the fixtures at {server.base_url}, e.g. {server.job_link('1')} or {server.search_url}start=0")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
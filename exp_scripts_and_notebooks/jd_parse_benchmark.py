@@ -0,0 +1,55 @@
+# Per-page parse time of the full and the fast JD page parsing paths on saved job pages,
+# also checking that both return the same job post. Run from the repo root with:
+#   python -m exp_scripts_and_notebooks.jd_parse_benchmark <folder with saved job pages (*.html)>
+import sys
+import time
+import tempfile
+from pathlib import Path
+
+from job_post_collector.jd_getter import JD_Getter, JD_GetterConfig
+
+
+def time_parse(jd_getter: JD_Getter, pages: list, repeat: int = 3):
+    results = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = []
+        for content in pages:
+            try:
+                results.append(jd_getter.parse_job_page(content, "saved page"))
+            except ValueError:
+                results.append(None)
+    return (time.perf_counter() - start) / (repeat * len(pages)), results
+
+
+def main():
+    pages_dir = Path(sys.argv[1])
+    pages = [page.read_bytes() for page in sorted(pages_dir.glob("*.html"))]
+    if not pages:
+        print(f"No saved pages found in {pages_dir}")
+        return
+    
+    log_dir = tempfile.mkdtemp()
+    variants = {
+        "full, html.parser": JD_GetterConfig(fast_parse=False, log_dir=log_dir),
+        "fast, html.parser": JD_GetterConfig(fast_parse=True, log_dir=log_dir),
+    }
+    try:
+        import lxml  # noqa: F401
+        variants["full, lxml"] = JD_GetterConfig(fast_parse=False, html_parser="lxml", log_dir=log_dir)
+        variants["fast, lxml"] = JD_GetterConfig(fast_parse=True, html_parser="lxml", log_dir=log_dir)
+    except ImportError:
+        pass
+    
+    baseline_time, baseline_results = None, None
+    print(f"{len(pages)} saved pages")
+    for name, config in variants.items():
+        per_page, results = time_parse(JD_Getter(config, db=None), pages)
+        if baseline_results is None:
+            baseline_time, baseline_results = per_page, results
+        mismatches = sum(result != expected for result, expected in zip(results, baseline_results))
+        print(f"{name:20s}: {per_page * 1000:8.2f} ms/page, {baseline_time / per_page:5.1f}x, {mismatches} pages differ from the full html.parser output")
+        
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+import argparse
+
+from job_post_collector.db import DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+from job_post_collector.parquet_export import EXPORT_TABLES, export_all
+
+
+# Appends the rows collected since the last run to the parquet files in `mount/exports`, one folder per entry day.
+# Run it as often as needed (e.g. from cron), the analysts read the files instead of querying the collection DB:
+#   pd.read_parquet("mount/exports/jobs")
+mysql_creds = DB_Creds(
+    host = "localhost",
+    port = '3306',
+    user = "local",
+    password = "local",
+    database = "jobs_data"
+)
+sqlite_creds = SQLite_Creds(path="./mount/jobs_data.sqlite3")
+export_dir = "./mount/exports"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sqlite", action="store_true", help="export the local SQLite file instead of MySQL")
+    parser.add_argument("--tables", nargs="+", choices=list(EXPORT_TABLES), help="tables to export, all of them by default")
+    parser.add_argument("--row-group-size", type=int, default=10000, help="rows held in memory and written at a time")
+    args = parser.parse_args()
+    
+    db = open_db(sqlite_creds if args.sqlite else mysql_creds)
+    exported = export_all(db, export_dir, tables=args.tables, row_group_size=args.row_group_size)
+    for table, counts in exported.items():
+        print(f" ||>> {table}: {counts['rows']} new rows in {counts['files']} files")
+    
+if __name__ == "__main__":
+    main()
@@ -5,4 +5,8 @@ if __name__ == "__main__":
     os.makedirs(Path("./mount/logs/jd_getter_logs"), exist_ok=True)
     os.makedirs(Path("./mount/logs/scroller_logs"), exist_ok=True)
     os.makedirs(Path("./mount/mysql_data"), exist_ok=True)
-    os.makedirs(Path("./mount/scrape_scroll_saves"), exist_ok=True)
\ No newline at end of file
+    os.makedirs(Path("./mount/scrape_scroll_saves"), exist_ok=True)
+    os.makedirs(Path("./mount/jd_page_cache"), exist_ok=True)
+    os.makedirs(Path("./mount/scheduler"), exist_ok=True)
+    os.makedirs(Path("./mount/metrics"), exist_ok=True)
+    os.makedirs(Path("./mount/exports"), exist_ok=True)
@@ -0,0 +1,68 @@
+import gzip
+import json
+import os
+import zlib
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List
+
+
+class CardLog:
+    def __init__(self, base_dir: str, key: str):
+        
+        # <key>.ndjson.gz holds one job card record per line, each append adding a new gzip member,
+        # <key>.cursor.json tells how far the search got
+        self.log_file = Path(os.path.join(base_dir, f"{key}.ndjson.gz"))
+        self.cursor_file = Path(os.path.join(base_dir, f"{key}.cursor.json"))
+        
+        os.makedirs(base_dir, exist_ok=True)
+        
+        
+    def append(self, records: List[dict]):
+        if not records:
+            return
+        with gzip.open(self.log_file, "at", encoding="utf-8") as file:
+            file.write("".join([json.dumps(record) + "\n" for record in records]))
+            
+            
+    def read(self) -> Iterator[dict]:
+        if not self.log_file.exists():
+            return
+        try:
+            with gzip.open(self.log_file, "rt", encoding="utf-8") as file:
+                for line in file:
+                    if line.endswith("\n"):
+                        yield json.loads(line)
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            # the last member was cut short by a crash, the records before it are still valid
+            pass
+        
+        
+    def rewrite(self, records: List[dict]):
+        # replaces the log with a single member holding `records`, e.g. the ones still readable after a crash cut the
+        # last member short, as the members appended after a corrupt one could not be read back
+        tmp_file = self.log_file.with_suffix(".tmp")
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as file:
+            file.write("".join([json.dumps(record) + "\n" for record in records]))
+        os.replace(tmp_file, self.log_file)
+        
+        
+    def load_cursor(self) -> dict:
+        if not self.cursor_file.exists():
+            return None
+        with open(self.cursor_file, "r", encoding="utf-8") as file:
+            return json.load(file)
+        
+        
+    def save_cursor(self, **cursor):
+        cursor["updated_at"] = datetime.now().isoformat(timespec="seconds")
+        tmp_file = self.cursor_file.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(cursor, file)
+        os.replace(tmp_file, self.cursor_file)
+        
+        
+    def reset(self):
+        for path in [self.log_file, self.cursor_file]:
+            if path.exists():
+                os.remove(path)
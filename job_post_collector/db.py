@@ -2,11 +2,20 @@ import mysql.connector as mysql
 from dataclasses import dataclass 
 from datetime import datetime
 import json
+import logging
 import os
+import time
 import pandas as pd
 from tqdm import tqdm
 from pathlib import Path
 import traceback
+from typing import List, Iterator, Tuple, NamedTuple
+
+from job_post_collector.metrics import METRICS
+from job_post_collector.job_search import QueryClause, parse_search_query, to_mysql_boolean
+
+
+logger = logging.getLogger(__name__)
 
 
 @dataclass 
@@ -19,20 +28,95 @@ class DB_Creds:
     database: str
     
     
+class ScrolledJob(NamedTuple):
+    
+    job_id: str
+    job_link: str
+    
+    
+class QueuedJob(NamedTuple):
+    
+    job_id: str
+    job_link: str
+    attempts: int  # including the current one
+    
+    
+class JobMatch(NamedTuple):
+    
+    job_id: str
+    job_link: str
+    seniority_level: str
+    score: float  # relevance of the description to the query, higher is better
+    
+    
+JD_QUEUE_STATES = ["pending", "leased", "done", "failed_retryable", "failed_permanent"]
+
+
+# (version, description, method applying it, deferred), applied in order and recorded in the schema_migrations table.
+# The deferred ones go through the existing rows (backfills, index builds), so they are only run by `migrate_schema.py`
+SCHEMA_MIGRATIONS = [
+    (1, "scrolled_jobs and jobs indexes", "_migrate_indexes", False),
+    (2, "jobs_seen, searches and job_sightings tables", "_migrate_sightings_tables", False),
+    (3, "jobs_seen and job_sightings backfill from scrolled_jobs", "_migrate_backfill_sightings", True),
+    (4, "jobs job_description full-text index", "_migrate_fulltext_index", True),
+    (5, "jobs full-text index keyed by a stable id", "_migrate_fulltext_key", True),
+]
+    
+    
 class DB:
-    def __init__(self, creds: DB_Creds):
-        
-        self.db = mysql.connect(
-            host = creds.host,
-            port = creds.port,
-            user = creds.user,
-            password = creds.password,
-            database = creds.database
-        )
+    INSERT_IGNORE = "INSERT IGNORE"
+    
+    def __init__(self, creds: DB_Creds, chunk_size: int = 1000):
+        
+        self.creds = creds
+        self.chunk_size = chunk_size  # rows read at a time by the streaming readers
+        self.db = self._connect()
         
         #self._create_jobs_old_table()
         self._create_jobs_table()
         self._create_scrolled_jobs_table()
+        self._create_jd_queue_table()
+        self._create_schema_migrations_table()
+        
+        # the quick migrations are applied right away, the deferred ones wait for `migrate_schema`.
+        # A failed one is retried on the next start, meanwhile the collectors keep working with the last applied version
+        self.schema_version = self.get_schema_version()
+        try:
+            self.migrate_schema(run_deferred=False)
+        except Exception:
+            logger.exception(f"Schema migration failed, staying at schema version {self.schema_version}")
+        
+    
+    def _connect(self):
+        return mysql.connect(
+            host = self.creds.host,
+            port = self.creds.port,
+            user = self.creds.user,
+            password = self.creds.password,
+            database = self.creds.database
+        )
+        
+        
+    def _stream(self, command: str, params: tuple = (), chunk_size: int = None) -> Iterator[tuple]:
+        
+        # unbuffered reads on a dedicated connection, so rows arrive as they are consumed and
+        # the main connection stays free for the writes done meanwhile by the consumer
+        connection = self._connect()
+        cursor = connection.cursor(buffered=False)
+        try:
+            cursor.execute(command, params)
+            while True:
+                rows = cursor.fetchmany(chunk_size or self.chunk_size)
+                if not rows:
+                    break
+                yield from rows
+        finally:
+            try:
+                cursor.close()
+                connection.close()
+            except mysql.Error:
+                # the consumer stopped early and left unread rows behind
+                connection.disconnect()
         
     
     def _create_jobs_old_table(self):
@@ -98,13 +182,337 @@ class DB:
             job_link VARCHAR(2555),
             job_id VARCHAR(255),
             search_keyword VARCHAR(255),
-            search_location VARCHAR(255)
+            search_location VARCHAR(255),
+            UNIQUE KEY uq_scrolled_job (job_id, search_keyword, search_location),
+            INDEX idx_scrolled_job_id (job_id)
             )
             """
         cursor.execute(command)
         self.db.commit()
         cursor.close()
         
+        
+    def _create_jd_queue_table(self):
+        
+        cursor = self.db.cursor()
+        command = f"""
+        CREATE TABLE IF NOT EXISTS jd_queue(
+            job_id VARCHAR(255) PRIMARY KEY,
+            job_link VARCHAR(2555),
+            state ENUM({', '.join([f"'{state}'" for state in JD_QUEUE_STATES])}) NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            lease_owner VARCHAR(255),
+            lease_expires_at DATETIME,
+            last_error TEXT,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            INDEX idx_jd_queue_claim (state, next_attempt_at),
+            INDEX idx_jd_queue_lease (state, lease_expires_at)
+            )
+            """
+        cursor.execute(command)
+        self.db.commit()
+        cursor.close()
+        
+        
+    def _create_schema_migrations_table(self):
+        
+        cursor = self.db.cursor()
+        command = """
+        CREATE TABLE IF NOT EXISTS schema_migrations(
+            version INT PRIMARY KEY,
+            name VARCHAR(255),
+            state VARCHAR(16) NOT NULL DEFAULT 'running',
+            checkpoint BIGINT NOT NULL DEFAULT 0,
+            applied_at TIMESTAMP NULL DEFAULT NULL
+            )
+            """
+        cursor.execute(command)
+        self.db.commit()
+        cursor.close()
+        
+        
+    def _create_sightings_tables(self):
+        
+        # one row per job with a compact numeric id, and one small row per (job, search) sighting
+        cursor = self.db.cursor()
+        commands = ["""
+        CREATE TABLE IF NOT EXISTS jobs_seen(
+            id BIGINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            job_id VARCHAR(255) NOT NULL,
+            job_link VARCHAR(2555),
+            first_seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE KEY uq_jobs_seen_job_id (job_id)
+            )
+            ""","""
+        CREATE TABLE IF NOT EXISTS searches(
+            id INT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+            search_keyword VARCHAR(255) NOT NULL,
+            search_location VARCHAR(255) NOT NULL,
+            UNIQUE KEY uq_search (search_keyword, search_location)
+            )
+            ""","""
+        CREATE TABLE IF NOT EXISTS job_sightings(
+            job_ref BIGINT UNSIGNED NOT NULL,
+            search_ref INT UNSIGNED NOT NULL,
+            seen_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (job_ref, search_ref),
+            INDEX idx_job_sightings_search (search_ref, seen_at)
+            )
+            """]
+        for command in commands:
+            cursor.execute(command)
+        self.db.commit()
+        cursor.close()
+        
+        
+    def get_schema_version(self) -> int:
+        
+        cursor = self.db.cursor()
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations WHERE state = 'applied'")
+        (version,) = cursor.fetchone()
+        cursor.close()
+        return int(version)
+    
+    
+    def migrate_schema(self, run_deferred: bool = True, batch_size: int = 5000, pause: float = 0.0) -> int:
+        
+        # stops at the first deferred migration when `run_deferred` is off, as the later versions build on it
+        for version, name, method, deferred in SCHEMA_MIGRATIONS:
+            if version <= self.schema_version:
+                continue
+            if deferred and not run_deferred:
+                break
+            cursor = self.db.cursor()
+            cursor.execute(f"{self.INSERT_IGNORE} INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+            self.db.commit()
+            cursor.close()
+            
+            # a failure leaves the migration 'running' and stops the later ones
+            try:
+                if deferred:
+                    getattr(self, method)(version, batch_size=batch_size, pause=pause)
+                else:
+                    getattr(self, method)()
+            except Exception:
+                self.db.rollback()
+                raise
+            
+            cursor = self.db.cursor()
+            cursor.execute("UPDATE schema_migrations SET state = 'applied', applied_at = %s WHERE version = %s", (datetime.now(), version))
+            self.db.commit()
+            cursor.close()
+            self.schema_version = version
+        return self.schema_version
+    
+    
+    def _migrate_indexes(self):
+        
+        # tables created before these keys were introduced need them added explicitly,
+        # the job_id index first as the search for duplicates goes through it
+        self._add_index("scrolled_jobs", "idx_scrolled_job_id", "INDEX idx_scrolled_job_id (job_id)")
+        if not self._index_exists("scrolled_jobs", "uq_scrolled_job"):
+            self._delete_duplicate_scrolled_jobs()
+            self._add_index("scrolled_jobs", "uq_scrolled_job", "UNIQUE KEY uq_scrolled_job (job_id, search_keyword, search_location)")
+        self._add_index("jobs", "idx_jobs_entry_date", "INDEX idx_jobs_entry_date (entry_date)")
+        
+        
+    def _migrate_sightings_tables(self):
+        
+        # from here on the scrolled jobs are also recorded in the new tables, see `_record_sightings`
+        self._create_sightings_tables()
+        
+        
+    def _migrate_backfill_sightings(self, version: int, batch_size: int = 5000, pause: float = 0.0):
+        
+        # walks scrolled_jobs by entry_id in batches, each one committed on its own so that no lock is held for long,
+        # the last entry_id copied is checkpointed so that an interrupted backfill resumes where it stopped
+        cursor = self.db.cursor()
+        cursor.execute("SELECT checkpoint FROM schema_migrations WHERE version = %s", (version,))
+        (last_entry_id,) = cursor.fetchone()
+        cursor.close()
+        
+        progress = tqdm(desc="sightings backfill", unit="rows")
+        while True:
+            cursor = self.db.cursor()
+            command = "SELECT MAX(entry_id), COUNT(*) FROM (SELECT entry_id FROM scrolled_jobs WHERE entry_id > %s ORDER BY entry_id LIMIT %s) AS batch"
+            cursor.execute(command, (last_entry_id, batch_size))
+            upper_entry_id, rows = cursor.fetchone()
+            if upper_entry_id is None:
+                cursor.close()
+                break
+            self._backfill_sightings_batch(cursor, last_entry_id, upper_entry_id)
+            cursor.execute("UPDATE schema_migrations SET checkpoint = %s WHERE version = %s", (upper_entry_id, version))
+            self.db.commit()
+            cursor.close()
+            last_entry_id = upper_entry_id
+            progress.update(rows)
+            if pause:
+                time.sleep(pause)
+        progress.close()
+        
+        
+    def _backfill_sightings_batch(self, cursor, lower_entry_id: int, upper_entry_id: int):
+        
+        params = (lower_entry_id, upper_entry_id)
+        cursor.execute("""
+        INSERT IGNORE INTO searches (search_keyword, search_location)
+        SELECT DISTINCT search_keyword, search_location FROM scrolled_jobs WHERE entry_id > %s AND entry_id <= %s
+        """, params)
+        # rows written meanwhile by the collectors are dated at their insert, the older sightings win
+        cursor.execute("""
+        INSERT INTO jobs_seen (job_id, job_link, first_seen_at)
+        SELECT job_id, job_link, entry_date FROM scrolled_jobs WHERE entry_id > %s AND entry_id <= %s ORDER BY entry_id
+        ON DUPLICATE KEY UPDATE first_seen_at = LEAST(first_seen_at, VALUES(first_seen_at))
+        """, params)
+        cursor.execute("""
+        INSERT IGNORE INTO job_sightings (job_ref, search_ref, seen_at)
+        SELECT js.id, s.id, sj.entry_date FROM scrolled_jobs sj
+        JOIN jobs_seen js ON js.job_id = sj.job_id
+        JOIN searches s ON s.search_keyword = sj.search_keyword AND s.search_location = sj.search_location
+        WHERE sj.entry_id > %s AND sj.entry_id <= %s
+        """, params)
+        
+        
+    def _migrate_fulltext_index(self, version: int, batch_size: int = None, pause: float = None):
+        
+        # a single statement, InnoDB builds the index over the whole table and then keeps it up to date on every
+        # committed insert or update. The first FULLTEXT index of a table rebuilds it, blocking the writes meanwhile
+        cursor = self.db.cursor()
+        command = """
+        SELECT COUNT(*) FROM information_schema.statistics 
+        WHERE table_schema = DATABASE() AND table_name = 'jobs' AND index_name = 'ft_jobs_description'
+        """
+        cursor.execute(command)
+        (exists,) = cursor.fetchone()
+        if not exists:
+            cursor.execute("ALTER TABLE jobs ADD FULLTEXT INDEX ft_jobs_description (job_description)")
+            self.db.commit()
+        cursor.close()
+        
+        
+    def _migrate_fulltext_key(self, version: int, batch_size: int = None, pause: float = None):
+        
+        # the FULLTEXT index is part of the jobs table, only the SQLite index is kept apart and needs the key
+        pass
+        
+        
+    @property
+    def sightings_ready(self) -> bool:
+        # the readers move to the compact tables once they hold every scrolled job
+        return self.schema_version >= 3
+        
+        
+    def _record_sightings(self, entries: List[dict], batch_size: int = 500):
+        
+        # written in the caller's transaction, which commits them together with the scrolled_jobs rows
+        if self.schema_version < 2 or not entries:
+            return
+        jobs = {entry["job_id"]: {"job_id": entry["job_id"], "job_link": entry["job_link"]} for entry in entries}
+        searches = {}
+        for entry in entries:
+            searches.setdefault((entry["search_keyword"], entry["search_location"]), []).append(entry["job_id"])
+        
+        self._bulk_insert("searches", [{"search_keyword": keyword, "search_location": location} for keyword, location in searches], on_duplicate="ignore", commit=False)
+        self._bulk_insert("jobs_seen", list(jobs.values()), on_duplicate="ignore", commit=False)
+        cursor = self.db.cursor()
+        for (keyword, location), job_ids in searches.items():
+            for start in range(0, len(job_ids), batch_size):
+                batch = job_ids[start:start + batch_size]
+                command = f"""
+                {self.INSERT_IGNORE} INTO job_sightings (job_ref, search_ref)
+                SELECT js.id, s.id FROM jobs_seen js JOIN searches s ON s.search_keyword = %s AND s.search_location = %s
+                WHERE js.job_id IN ({', '.join(['%s' for _ in range(len(batch))])})
+                """
+                with METRICS.timer("db_write_seconds", table="job_sightings"):
+                    cursor.execute(command, [keyword, location] + batch)
+        cursor.close()
+        
+        
+    def insert_sightings(self, sightings: List[dict]) -> int:
+        
+        # sightings given by their natural keys (job_id, search_keyword, search_location, seen_at), e.g. copied from
+        # another database, mapped to the ids of the jobs_seen and searches rows already there
+        if not sightings:
+            return 0
+        cursor = self.db.cursor()
+        command = f"""
+        {self.INSERT_IGNORE} INTO job_sightings (job_ref, search_ref, seen_at)
+        SELECT js.id, s.id, %s FROM jobs_seen js JOIN searches s ON s.search_keyword = %s AND s.search_location = %s
+        WHERE js.job_id = %s
+        """
+        rows = [(sighting["seen_at"], sighting["search_keyword"], sighting["search_location"], sighting["job_id"]) for sighting in sightings]
+        try:
+            with METRICS.timer("db_write_seconds", table="job_sightings"):
+                cursor.executemany(command, rows)
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        finally:
+            cursor.close()
+        METRICS.inc("db_rows_written_total", len(rows), table="job_sightings")
+        return len(rows)
+        
+        
+    def _index_exists(self, table: str, index_name: str) -> bool:
+        
+        cursor = self.db.cursor()
+        command = """
+        SELECT COUNT(*) FROM information_schema.statistics 
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        """
+        cursor.execute(command, (table, index_name))
+        (exists,) = cursor.fetchone()
+        cursor.close()
+        return bool(exists)
+    
+    
+    def _add_index(self, table: str, index_name: str, definition: str):
+        
+        # a failure (e.g. duplicate rows for a unique key) is raised, so that the migration adding it is retried
+        if self._index_exists(table, index_name):
+            return
+        cursor = self.db.cursor()
+        cursor.execute(f"ALTER TABLE {table} ADD {definition}")
+        self.db.commit()
+        cursor.close()
+        
+        
+    def _delete_duplicate_scrolled_jobs(self, batch_size: int = 5000) -> int:
+        
+        # the searches run before the unique key existed stored the same (job_id, search_keyword, search_location)
+        # on every run, only the first row of each is kept. Walks the table by entry_id in short transactions
+        deleted = 0
+        last_entry_id = 0
+        while True:
+            cursor = self.db.cursor()
+            command = "SELECT MAX(entry_id) FROM (SELECT entry_id FROM scrolled_jobs WHERE entry_id > %s ORDER BY entry_id LIMIT %s) AS batch"
+            cursor.execute(command, (last_entry_id, batch_size))
+            (upper_entry_id,) = cursor.fetchone()
+            if upper_entry_id is None:
+                cursor.close()
+                break
+            self._delete_duplicate_scrolled_jobs_batch(cursor, last_entry_id, upper_entry_id)
+            deleted += cursor.rowcount
+            self.db.commit()
+            cursor.close()
+            last_entry_id = upper_entry_id
+        if deleted:
+            logger.info(f"Deleted {deleted} duplicate rows from scrolled_jobs")
+        return deleted
+    
+    
+    def _delete_duplicate_scrolled_jobs_batch(self, cursor, lower_entry_id: int, upper_entry_id: int):
+        
+        command = """
+        DELETE s FROM scrolled_jobs s
+        JOIN scrolled_jobs k ON k.job_id = s.job_id AND k.search_keyword = s.search_keyword
+            AND k.search_location = s.search_location AND k.entry_id < s.entry_id
+        WHERE s.entry_id > %s AND s.entry_id <= %s
+        """
+        cursor.execute(command, (lower_entry_id, upper_entry_id))
+        
     
     def insert_scrolled_job(self, entries: dict):
         
@@ -113,9 +521,66 @@ class DB:
         command = f"""INSERT INTO scrolled_jobs ({', '.join(entry_tags)})"""
         command += f" VALUES ({', '.join(['%s' for _ in range(len(entry_tags))])})"
         values = [entries[tag] for tag in entry_tags]
-        cursor.execute(command, values)
-        self.db.commit()
+        with METRICS.timer("db_write_seconds", table="scrolled_jobs"):
+            cursor.execute(command, values)
+            self._record_sightings([entries])
+            self.db.commit()
+        METRICS.inc("db_rows_written_total", table="scrolled_jobs")
+        cursor.close()
+        
+        
+    def _bulk_insert(self, table: str, entries: List[dict], on_duplicate: str = "ignore", batch_size: int = 500, commit: bool = True) -> int:
+        
+        if not entries:
+            return 0
+        
+        entry_tags = list(entries[0].keys())
+        row_placeholder = f"({', '.join(['%s' for _ in range(len(entry_tags))])})"
+        if on_duplicate == "ignore":
+            prefix, suffix = "INSERT IGNORE", ""
+        elif on_duplicate == "update":
+            prefix = "INSERT"
+            suffix = " ON DUPLICATE KEY UPDATE " + ", ".join([f"{tag}=VALUES({tag})" for tag in entry_tags])
+        else:
+            raise ValueError(f"Unknown on_duplicate mode: {on_duplicate}")
+        
+        # number of affected rows (ignored duplicates count 0, updated rows count 2)
+        inserted = 0
+        cursor = self.db.cursor()
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            command = f"""{prefix} INTO {table} ({', '.join(entry_tags)})"""
+            command += f" VALUES {', '.join([row_placeholder for _ in range(len(batch))])}{suffix}"
+            values = [entry[tag] for entry in batch for tag in entry_tags]
+            with METRICS.timer("db_write_seconds", table=table):
+                cursor.execute(command, values)
+                if commit:
+                    self.db.commit()
+            METRICS.inc("db_rows_written_total", len(batch), table=table)
+            inserted += cursor.rowcount
         cursor.close()
+        return inserted
+    
+    
+    def insert_scrolled_jobs(self, entries: List[dict], known_entries: List[dict] = (), batch_size: int = 500) -> int:
+        
+        # `entries` get their whole card in scrolled_jobs. `known_entries`, the cards of jobs already stored by an earlier
+        # search, only get a job_sightings row once those tables are backfilled (whole rows as well until then),
+        # everything in a single transaction
+        rows = list(entries) if self.sightings_ready else list(entries) + list(known_entries)
+        try:
+            inserted = self._bulk_insert("scrolled_jobs", rows, on_duplicate="ignore", batch_size=batch_size, commit=False)
+            self._record_sightings(list(entries) + list(known_entries))
+            self.db.commit()
+        except Exception:
+            self.db.rollback()
+            raise
+        return inserted
+    
+    
+    def insert_jobs(self, entries: List[dict], on_duplicate: str = "ignore", batch_size: int = 500) -> int:
+        
+        return self._bulk_insert("jobs", entries, on_duplicate=on_duplicate, batch_size=batch_size)
         
         
     def insert_job_old(self, entries: dict):
@@ -132,19 +597,127 @@ class DB:
     
     def get_all_scrolled_jobs(self) -> pd.DataFrame:
         
+        result = [(job.job_link, job.job_id) for job in self.iter_scrolled_jobs(distinct=False)]
+        return pd.DataFrame(result, columns=['job_link', 'job_id'])        
+        
+    
+    def iter_scrolled_jobs(self, distinct: bool = True, chunk_size: int = None) -> Iterator[ScrolledJob]:
+        
+        if distinct and self.sightings_ready:
+            command = "SELECT job_id, job_link FROM jobs_seen"
+        elif distinct:
+            # one record per job instead of one per search term that found it
+            command = "SELECT job_id, MIN(job_link) FROM scrolled_jobs GROUP BY job_id"
+        else:
+            command = "SELECT job_id, job_link FROM scrolled_jobs"
+        for row in self._stream(command, chunk_size=chunk_size):
+            yield ScrolledJob(*row)
+            
+    
+    def iter_scrolled_job_ids(self, chunk_size: int = None) -> Iterator[str]:
+        
+        command = "SELECT job_id FROM jobs_seen" if self.sightings_ready else "SELECT DISTINCT job_id FROM scrolled_jobs"
+        for (job_id,) in self._stream(command, chunk_size=chunk_size):
+            yield job_id
+            
+    
+    def get_last_sighting(self, search_keyword: str, search_location: str) -> datetime:
+        
+        # when the search last found a job it had not seen before (None if it never ran)
+        if self.sightings_ready:
+            command = """
+            SELECT MAX(j.seen_at) FROM job_sightings j JOIN searches s ON s.id = j.search_ref
+            WHERE s.search_keyword = %s AND s.search_location = %s
+            """
+        else:
+            command = "SELECT MAX(entry_date) FROM scrolled_jobs WHERE search_keyword = %s AND search_location = %s"
         cursor = self.db.cursor()
-        command = "SELECT job_link, job_id FROM scrolled_jobs"
-        cursor.execute(command)
-        result = cursor.fetchall()
+        cursor.execute(command, (search_keyword, search_location))
+        (last_seen,) = cursor.fetchone()
         cursor.close()
-        return pd.DataFrame(result, columns=['job_link', 'job_id'])        
+        # SQLite returns the text it stored
+        return datetime.fromisoformat(last_seen) if isinstance(last_seen, str) else last_seen
+        
+        
+    def iter_search_sightings(self, since: datetime = None, chunk_size: int = None) -> Iterator[Tuple[str, str, str]]:
+        
+        # (job_id, search_keyword, search_location) for every search that found each job
+        if self.sightings_ready:
+            command = """
+            SELECT js.job_id, s.search_keyword, s.search_location FROM job_sightings j
+            JOIN jobs_seen js ON js.id = j.job_ref JOIN searches s ON s.id = j.search_ref
+            """
+            date_column = "j.seen_at"
+        else:
+            command = "SELECT job_id, search_keyword, search_location FROM scrolled_jobs"
+            date_column = "entry_date"
+        params = ()
+        if since is not None:
+            command += f" WHERE {date_column} >= %s"
+            params = (since,)
+        yield from self._stream(command, params, chunk_size=chunk_size)
+        
+    
+    def get_scrolled_job_ids(self) -> set:
+        
+        return set(self.iter_scrolled_job_ids())
+        
+    
+    def get_pending_jobs(self, page_size: int = None) -> Iterator[ScrolledJob]:
+        
+        # scrolled job ids missing from jobs, paged by job_id so that rows inserted meanwhile don't shift the pages
+        if self.sightings_ready:
+            command = """
+            SELECT s.job_id, s.job_link FROM jobs_seen s
+            WHERE s.job_id > %s AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+            ORDER BY s.job_id
+            LIMIT %s
+            """
+        else:
+            command = """
+            SELECT s.job_id, MIN(s.job_link) FROM scrolled_jobs s
+            WHERE s.job_id > %s AND NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+            GROUP BY s.job_id
+            ORDER BY s.job_id
+            LIMIT %s
+            """
+        last_job_id = ""
+        while True:
+            cursor = self.db.cursor()
+            cursor.execute(command, (last_job_id, page_size or self.chunk_size))
+            page = [ScrolledJob(*row) for row in cursor.fetchall()]
+            cursor.close()
+            if not page:
+                break
+            yield from page
+            last_job_id = page[-1].job_id
+        
+    
+    def iter_pending_jobs(self, chunk_size: int = None) -> Iterator[ScrolledJob]:
+        
+        # same work as `get_pending_jobs` as a single streamed statement, for consumers writing from other threads
+        if self.sightings_ready:
+            command = """
+            SELECT s.job_id, s.job_link FROM jobs_seen s
+            WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+            ORDER BY s.job_id
+            """
+        else:
+            command = """
+            SELECT s.job_id, MIN(s.job_link) FROM scrolled_jobs s
+            WHERE NOT EXISTS (SELECT 1 FROM jobs j WHERE j.job_id = s.job_id)
+            GROUP BY s.job_id
+            ORDER BY s.job_id
+            """
+        for row in self._stream(command, chunk_size=chunk_size):
+            yield ScrolledJob(*row)
         
     
     def check_if_job_already_scraped(self, job_id: str):
         
         cursor = self.db.cursor()
-        command = f"SELECT * FROM jobs WHERE job_id='{job_id}'"
-        cursor.execute(command)
+        command = "SELECT 1 FROM jobs WHERE job_id = %s LIMIT 1"
+        cursor.execute(command, (job_id,))
         result = cursor.fetchall()
         cursor.close()
         return True if result else False
@@ -157,6 +730,173 @@ class DB:
         command = f"""INSERT INTO jobs ({', '.join(entry_tags)})"""
         command += f" VALUES ({', '.join(['%s' for _ in range(len(entry_tags))])})"
         values = [entries[tag] for tag in entry_tags]
-        cursor.execute(command, values)
+        with METRICS.timer("db_write_seconds", table="jobs"):
+            cursor.execute(command, values)
+            self.db.commit()
+        METRICS.inc("db_rows_written_total", table="jobs")
+        cursor.close()
+        
+        
+    def _fulltext_match(self, clauses: List[QueryClause]) -> Tuple[str, str, str, list, list]:
+        
+        # (FROM, WHERE, score expression, score params, WHERE params) matching the descriptions through the FULLTEXT index
+        query = to_mysql_boolean(clauses)
+        match = "MATCH(j.job_description) AGAINST (%s IN BOOLEAN MODE)"
+        return "jobs j", match, match, [query], [query]
+    
+    
+    def search_jobs(self,
+                    query: str,
+                    search_keyword: str = None,
+                    location: str = None,
+                    seniority_level: str = None,
+                    limit: int = 50) -> List[JobMatch]:
+        
+        # e.g. `search_jobs('python (spark OR hadoop) -java "machine learning"', location="Bengaluru")`,
+        # see `parse_search_query` for the query syntax
+        if self.schema_version < 5:
+            raise RuntimeError("The full-text index is not built yet, run migrate_schema.py")
+        source, condition, score, score_params, params = self._fulltext_match(parse_search_query(query))
+        
+        filters = [condition]
+        if seniority_level is not None:
+            filters.append("j.seniority_level = %s")
+            params.append(seniority_level)
+        # checked only for the jobs matching the text, through the keys starting with job_id
+        if search_keyword is not None and self.sightings_ready:
+            # the searches finding an already stored job only record a sighting
+            filters.append("""EXISTS (SELECT 1 FROM jobs_seen js JOIN job_sightings g ON g.job_ref = js.id JOIN searches q ON q.id = g.search_ref
+                WHERE js.job_id = j.job_id AND q.search_keyword = %s)""")
+            params.append(search_keyword.replace(" ", "+"))
+        elif search_keyword is not None:
+            filters.append("EXISTS (SELECT 1 FROM scrolled_jobs s WHERE s.job_id = j.job_id AND s.search_keyword = %s)")
+            params.append(search_keyword.replace(" ", "+"))
+        if location is not None:
+            filters.append("EXISTS (SELECT 1 FROM scrolled_jobs s WHERE s.job_id = j.job_id AND s.location LIKE %s)")
+            params.append(f"%{location}%")
+        
+        command = f"""
+        SELECT j.job_id, j.job_link, j.seniority_level, {score} AS score FROM {source}
+        WHERE {' AND '.join(filters)}
+        ORDER BY score DESC
+        LIMIT %s
+        """
+        cursor = self.db.cursor()
+        with METRICS.timer("db_read_seconds", op="search"):
+            cursor.execute(command, score_params + params + [limit])
+            rows = cursor.fetchall()
+        cursor.close()
+        return [JobMatch(*row) for row in rows]
+    
+    
+    def enqueue_pending_jobs(self) -> int:
+        
+        # jobs already in the queue keep their state and attempts
+        queued = 0
+        page = []
+        for job in self.get_pending_jobs():
+            page.append(job._asdict())
+            if len(page) >= self.chunk_size:
+                queued += self._bulk_insert("jd_queue", page, on_duplicate="ignore")
+                page = []
+        queued += self._bulk_insert("jd_queue", page, on_duplicate="ignore")
+        return queued
+    
+    
+    def reclaim_expired_leases(self, max_attempts: int) -> int:
+        
+        # a lease expires when its worker died (or hung) on the job, which counts as a failed attempt
+        cursor = self.db.cursor()
+        command = """
+        UPDATE jd_queue SET state = CASE WHEN attempts >= %s THEN 'failed_permanent' ELSE 'failed_retryable' END,
+            lease_owner = NULL, lease_expires_at = NULL, last_error = 'lease expired'
+        WHERE state = 'leased' AND lease_expires_at < NOW()
+        """
+        cursor.execute(command, (max_attempts,))
+        self.db.commit()
+        reclaimed = cursor.rowcount
+        cursor.close()
+        return reclaimed
+    
+    
+    def claim_jd_jobs(self, owner: str, batch_size: int, lease_seconds: int, max_attempts: int) -> List[QueuedJob]:
+        
+        self.reclaim_expired_leases(max_attempts)
+        
+        # rows locked by other workers' claims are skipped instead of waited on, so no job is leased twice
+        cursor = self.db.cursor()
+        command = """
+        SELECT job_id, job_link, attempts FROM jd_queue
+        WHERE state IN ('pending', 'failed_retryable') AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """
+        try:
+            cursor.execute(command, (batch_size,))
+            rows = cursor.fetchall()
+            if rows:
+                command = f"""
+                UPDATE jd_queue SET state = 'leased', lease_owner = %s, lease_expires_at = NOW() + INTERVAL %s SECOND, attempts = attempts + 1
+                WHERE job_id IN ({', '.join(['%s' for _ in range(len(rows))])})
+                """
+                cursor.execute(command, [owner, lease_seconds] + [job_id for job_id, _, _ in rows])
+            self.db.commit()
+        except mysql.Error:
+            self.db.rollback()
+            raise
+        finally:
+            cursor.close()
+        return [QueuedJob(job_id, job_link, attempts + 1) for job_id, job_link, attempts in rows]
+    
+    
+    def renew_jd_leases(self, owner: str, job_ids: List[str], lease_seconds: int) -> int:
+        
+        # only the leases still held by this worker, a job reclaimed in the meantime stays with its new owner
+        if not job_ids:
+            return 0
+        cursor = self.db.cursor()
+        command = f"""
+        UPDATE jd_queue SET lease_expires_at = NOW() + INTERVAL %s SECOND
+        WHERE state = 'leased' AND lease_owner = %s AND job_id IN ({', '.join(['%s' for _ in range(len(job_ids))])})
+        """
+        cursor.execute(command, [lease_seconds, owner] + list(job_ids))
+        self.db.commit()
+        renewed = cursor.rowcount
+        cursor.close()
+        return renewed
+    
+    
+    def complete_jd_job(self, job_id: str, owner: str):
+        
+        cursor = self.db.cursor()
+        command = """
+        UPDATE jd_queue SET state = 'done', lease_owner = NULL, lease_expires_at = NULL, last_error = NULL
+        WHERE job_id = %s AND lease_owner = %s
+        """
+        cursor.execute(command, (job_id, owner))
         self.db.commit()
-        cursor.close()
\ No newline at end of file
+        cursor.close()
+        
+        
+    def fail_jd_job(self, job_id: str, owner: str, error: str, permanent: bool = False, retry_after: int = 0):
+        
+        cursor = self.db.cursor()
+        command = """
+        UPDATE jd_queue SET state = %s, lease_owner = NULL, lease_expires_at = NULL, last_error = %s,
+            next_attempt_at = NOW() + INTERVAL %s SECOND
+        WHERE job_id = %s AND lease_owner = %s
+        """
+        cursor.execute(command, ("failed_permanent" if permanent else "failed_retryable", error, retry_after, job_id, owner))
+        self.db.commit()
+        cursor.close()
+        
+        
+    def get_jd_queue_counts(self) -> dict:
+        
+        cursor = self.db.cursor()
+        command = "SELECT state, COUNT(*) FROM jd_queue GROUP BY state"
+        cursor.execute(command)
+        result = dict(cursor.fetchall())
+        cursor.close()
+        return {state: result.get(state, 0) for state in JD_QUEUE_STATES}
@@ -0,0 +1,87 @@
+import atexit
+import queue
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+
+class ChromeDriverPool:
+    def __init__(self, 
+                 driver_factory: Callable,
+                 size: int = 2,
+                 recycle_after: int = 10):
+        
+        # at most `size` browsers are alive at a time, each one is reused for up to `recycle_after`
+        # searches and is replaced earlier if it crashed
+        self.driver_factory = driver_factory
+        self.recycle_after = recycle_after
+        self.slots = threading.BoundedSemaphore(size)
+        self.idle_drivers = queue.LifoQueue()
+        self.uses = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        
+        atexit.register(self.close)
+        
+        
+    def acquire(self):
+        self.slots.acquire()
+        try:
+            return self.idle_drivers.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            driver = self.driver_factory()
+        except Exception:
+            self.slots.release()
+            raise
+        with self._lock:
+            self.uses[driver] = 0
+        return driver
+    
+    
+    def release(self, driver, broken: bool = False):
+        with self._lock:
+            self.uses[driver] = self.uses.get(driver, 0) + 1
+            retire = broken or self._closed or self.uses[driver] >= self.recycle_after
+            if retire:
+                self.uses.pop(driver, None)
+        if retire:
+            self._quit(driver)
+        else:
+            self.idle_drivers.put(driver)
+        self.slots.release()
+        
+        
+    @contextmanager
+    def driver(self):
+        driver = self.acquire()
+        try:
+            yield driver
+        except Exception:
+            self.release(driver, broken=True)
+            raise
+        else:
+            self.release(driver)
+        
+        
+    def _quit(self, driver):
+        try:
+            driver.quit()
+        except Exception:
+            # the browser may already be gone after a crash
+            pass
+        
+        
+    def close(self):
+        # quits the idle browsers, the ones still in use are quit when released
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                driver = self.idle_drivers.get_nowait()
+            except queue.Empty:
+                break
+            with self._lock:
+                self.uses.pop(driver, None)
+            self._quit(driver)
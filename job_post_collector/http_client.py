@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import brotli  # noqa: F401 (lets urllib3 decode brotli encoded bodies)
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+    
+    
+@dataclass
+class RequestTiming:
+    
+    url: str
+    status: int
+    new_connection: bool  # False when a kept-alive connection was reused
+    time_to_headers: float  # seconds until the response headers arrived (includes the connect and TLS handshake on a new connection)
+    transfer_time: float  # seconds spent downloading the body
+    size: int  # decompressed body size in bytes
+    
+    
+class HttpClient:
+    def __init__(self, 
+                 pool_size: int = 10,
+                 connect_timeout: float = 10,
+                 read_timeout: float = 30,
+                 max_body_size: int = 5 * 1024 * 1024,
+                 headers: dict = None):
+        
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_body_size = max_body_size
+        
+        # keep-alive connections pooled per host, shared by all the threads using the client
+        self.adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True)
+        self.session = requests.Session()
+        self.session.mount("http://", self.adapter)
+        self.session.mount("https://", self.adapter)
+        self.session.headers.update({"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})})
+        
+        self.stats = {"requests": 0, "new_connections": 0, "time_to_headers_new": 0.0, "time_to_headers_reused": 0.0, "transfer_time": 0.0, "bytes": 0}
+        self._connections_seen = {}
+        self._lock = threading.Lock()
+        
+        
+    def _opened_new_connection(self, response) -> bool:
+        # urllib3 counts the connections each host pool has opened, a rise means no idle connection was reused
+        pool = getattr(response.raw, "_pool", None)
+        if pool is None:
+            return True
+        with self._lock:
+            opened = pool.num_connections - self._connections_seen.get(id(pool), 0)
+            self._connections_seen[id(pool)] = pool.num_connections
+        return opened > 0
+    
+    
+    def get(self, url: str, **kwargs):
+        
+        start = time.perf_counter()
+        response = self.session.get(url, stream=True, timeout=self.timeout, **kwargs)
+        headers_at = time.perf_counter()
+        new_connection = self._opened_new_connection(response)
+        
+        try:
+            response.raise_for_status()
+            chunks = []
+            size = 0
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                size += len(chunk)
+                if size > self.max_body_size:
+                    raise ValueError(f"Response body of {url} exceeds {self.max_body_size} bytes")
+                chunks.append(chunk)
+            content = b"".join(chunks)
+        finally:
+            response.close()
+        
+        timing = RequestTiming(
+            url=url,
+            status=response.status_code,
+            new_connection=new_connection,
+            time_to_headers=headers_at - start,
+            transfer_time=time.perf_counter() - headers_at,
+            size=size
+        )
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["new_connections"] += new_connection
+            self.stats["time_to_headers_new" if new_connection else "time_to_headers_reused"] += timing.time_to_headers
+            self.stats["transfer_time"] += timing.transfer_time
+            self.stats["bytes"] += size
+            
+        return content, timing
+    
+    
+    def summary(self) -> str:
+        with self._lock:
+            stats = dict(self.stats)
+        reused = stats["requests"] - stats["new_connections"]
+        avg_new = stats["time_to_headers_new"] / stats["new_connections"] if stats["new_connections"] else 0
+        avg_reused = stats["time_to_headers_reused"] / reused if reused else 0
+        avg_transfer = stats["transfer_time"] / stats["requests"] if stats["requests"] else 0
+        return (f"{stats['requests']} requests on {stats['new_connections']} connections, "
+                f"avg time to headers {avg_new:.3f}s (new connection) / {avg_reused:.3f}s (reused), "
+                f"avg transfer {avg_transfer:.3f}s, {stats['bytes']} bytes")
+    
+    
+    def close(self):
+        self.session.close()
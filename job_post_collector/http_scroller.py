@@ -0,0 +1,136 @@
+import random
+import time
+import requests
+from typing import Callable, List
+
+from job_post_collector.db import DB
+from job_post_collector.job_scroller import SearchConfig, JobScroller
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.metrics import METRICS
+from job_post_collector.http_client import HttpClient
+from job_post_collector.pacing import THROTTLE_STATUSES, parse_retry_after
+
+
+BROWSER_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "en-US,en;q=0.9",
+}
+
+
+class HttpJobScroller(JobScroller):
+    def __init__(self, 
+                 config: SearchConfig,
+                 db: DB,
+                 known_jobs: KnownJobsIndex = None,
+                 http: HttpClient = None,
+                 job_sink: Callable[[List[dict]], None] = None):
+        
+        # the job cards are requested page by page without a browser, everything else works as in `JobScroller`
+        super().__init__(config, db, known_jobs, job_sink=job_sink)
+        self.http = http if http is not None else HttpClient(pool_size=1, headers=BROWSER_HEADERS)
+        self.pages_fetched = 0
+        
+        
+    def _get_chrome_driver(self):
+        return None
+    
+    
+    def _update_browser_stats(self):
+        pass
+    
+    
+    def wait_between_pages(self):
+        # same pacing as a 'See more jobs' click in the browser
+        start = time.monotonic()
+        if self.config.wait_mode == "event":
+            time.sleep(self.config.min_wait_interval)
+        else:
+            time.sleep(random.uniform(12, 14))
+        elapsed = time.monotonic() - start
+        self.wait_times["see_more"] += elapsed
+        METRICS.observe("sleep_seconds", elapsed, collector="scroller", reason="see_more")
+        
+        
+    def fetch_page(self, start: int) -> str:
+        try:
+            with METRICS.timer("fetch_seconds", collector="scroller", backend="http"):
+                content, timing = self.http.get(self.config.get_api_url(start))
+        except requests.HTTPError as e:
+            METRICS.inc("requests_total", collector="scroller", status=e.response.status_code if e.response is not None else "error")
+            raise
+        except requests.RequestException:
+            METRICS.inc("requests_total", collector="scroller", status="error")
+            raise
+        METRICS.inc("requests_total", collector="scroller", status=200)
+        self.pages_fetched += 1
+        self.bytes_transferred += timing.size
+        return content.decode("utf-8", errors="replace")
+    
+    
+    def checkpoint(self, html: str = None) -> int:
+        with METRICS.timer("parse_seconds", collector="scroller"):
+            jobs_df = self.scrape_job_info_from_html(html)
+        self.extracted_cards_count += len(jobs_df)
+        new_jobs = self.save_to_db(jobs_df)
+        self._update_stale_batches(new_jobs)
+        return len(jobs_df)
+    
+    
+    def run(self):
+        
+        self.logger.info(f"Starting the http job scroller for search_id: {self.config.search_id} and url: {self.config.get_api_url(0)}")
+        started_at = time.monotonic()
+        self.resume_from_card_log()
+        # an interrupted search continues from the first page not logged yet
+        start = self.extracted_cards_count = self.resume_cards
+        attempts = 0
+        try:
+            while True:
+                try:
+                    html = self.fetch_page(start)
+                except requests.RequestException as e:
+                    attempts += 1
+                    self.logger.error(f"Error occurred fetching the results at {start}: {e}")
+                    if attempts >= self.config.max_run_attempts:
+                        self.logger.error(f"Giving up search_id: {self.config.search_id} after {attempts} attempts.")
+                        METRICS.inc("failures_total", collector="scroller")
+                        METRICS.inc("searches_total", collector="scroller", outcome="given_up")
+                        break
+                    METRICS.inc("retries_total", collector="scroller")
+                    response = getattr(e, "response", None)
+                    retry_after = None
+                    if response is not None and response.status_code in THROTTLE_STATUSES:
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    with METRICS.timer("sleep_seconds", collector="scroller", reason="backoff"):
+                        time.sleep(retry_after if retry_after is not None else self.config.max_wait_timeout * attempts)
+                    continue
+                
+                cards = self.checkpoint(html)
+                start += cards
+                
+                # an empty fragment means there are no more results
+                if not cards:
+                    self.logger.warning("Reached the end of the results.")
+                    self.reached_end = True
+                elif len(self.added_jobs_ids) >= self.config.max_jobs:
+                    self.logger.warning("Max number of jobs collected. Stopping the scroller.")
+                elif self.config.stop_after_stale_batches and self.stale_batches >= self.config.stop_after_stale_batches:
+                    self.logger.warning(f"No new jobs in the last {self.stale_batches} pages. Stopping the scroller.")
+                else:
+                    self.wait_between_pages()
+                    continue
+                self.completed = True
+                break
+                
+            if self.completed:
+                self.save_card_log([], completed=True)
+                METRICS.inc("searches_total", collector="scroller", outcome="completed")
+            self.logger.info(f"Job Scroller ended for search_id: {self.config.search_id}. Added {len(self.added_jobs_ids)} jobs.")
+            waits = ", ".join([f"{reason} {seconds:.1f}s" for reason, seconds in self.wait_times.items()])
+            self.logger.info(f"Timing for search_id: {self.config.search_id} (http backend): "
+                             f"{time.monotonic() - started_at:.1f}s elapsed, {self.pages_fetched} pages, waits: {waits}")
+            self.logger.info(f"Transfer stats for search_id: {self.config.search_id}: {self.bytes_transferred / 2**20:.2f} MB decompressed")
+        finally:
+            self.logger.logger.removeHandler(self.log_handler)
+            self.log_handler.close()
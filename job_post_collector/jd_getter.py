@@ -1,14 +1,102 @@
 from dataclasses import dataclass, field 
-import requests
 import re
 import os
 import time
 from pathlib import Path
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
 import logging
+import requests
+import queue
+import socket
+import threading
+from collections import deque
 from tqdm import tqdm
 
-from job_post_collector.db import DB
+from job_post_collector.db import DB, ScrolledJob
+from job_post_collector.rate_limiter import TokenBucket
+from job_post_collector.http_client import HttpClient
+from job_post_collector.page_cache import RawPageCache
+from job_post_collector.pacing import AdaptivePacer, THROTTLE_STATUSES, parse_retry_after
+from job_post_collector.metrics import METRICS
+
+
+JOB_TAG_LABELS = ["Seniority level", "Employment type", "Job function", "Industries"]
+JOB_TAG_PATTERNS = {label: re.compile(label) for label in JOB_TAG_LABELS}
+DESCRIPTION_CLASS = "show-more-less-html__markup show-more-less-html__markup--clamp-after-5 relative overflow-hidden"
+
+# Only the description markup and the job criteria list are built into the soup by the fast parse
+JOB_PAGE_STRAINER = SoupStrainer(attrs={"class": [DESCRIPTION_CLASS, re.compile(r"(^|\s)description__job-criteria-list(\s|$)")]})
+
+
+def extract_job_tags_single_pass(soup: BeautifulSoup):
+    details = {}
+    missing_values = []
+    
+    # Every h3 is visited once and checked against all the labels, the first h3 matching a label wins as with `soup.find`
+    for label_element in soup.find_all("h3"):
+        text = label_element.string
+        if text is None:
+            continue
+        for label in JOB_TAG_LABELS:
+            if label not in details and JOB_TAG_PATTERNS[label].search(text):
+                value_element = label_element.find_next("span")
+                details[label] = value_element.get_text(strip=True) if value_element else "Not Found"
+                if details[label] == "Not Found":
+                    missing_values.append(label)
+        if len(details) == len(JOB_TAG_LABELS):
+            break
+        
+    return {label: details[label] for label in JOB_TAG_LABELS if label in details}, missing_values
+
+
+def extract_job_tags_by_label(soup: BeautifulSoup):
+    details = {}
+    missing_values = []
+    
+    # the first h3 of each label, and the first span after it anywhere further down the page
+    for label in JOB_TAG_LABELS:
+        label_element = soup.find("h3", string=JOB_TAG_PATTERNS[label])
+        if label_element:
+            value_element = label_element.find_next("span")
+            details[label] = value_element.get_text(strip=True) if value_element else "Not Found"
+            if details[label] == "Not Found":
+                missing_values.append(label)
+    
+    return details, missing_values
+
+
+def parse_job_html_full(content: bytes, parser: str = "html.parser"):
+    # the whole page, as `JD_Getter` parses it by default (`fast_parse=False`), returns None when it has no job description
+    soup = BeautifulSoup(content, parser)
+    
+    section = soup.find("div", class_=DESCRIPTION_CLASS)
+    if not section:
+        return None, []
+    
+    job_details, missing_values = extract_job_tags_by_label(soup)
+    return {"job_description": section.get_text(), **job_details}, missing_values
+
+
+def parse_job_html(content: bytes, parser: str = "html.parser"):
+    # returns None when the page has no job description
+    soup = BeautifulSoup(content, parser, parse_only=JOB_PAGE_STRAINER)
+    
+    section = soup.find("div", class_=DESCRIPTION_CLASS)
+    if not section:
+        return None, []
+    
+    job_details, missing_values = extract_job_tags_single_pass(soup)
+    return {"job_description": section.get_text(), **job_details}, missing_values
+
+
+def make_job_data(job_id: str, job_link: str, job_data_ret: dict) -> dict:
+    job_data = {"job_id": job_id, "job_link": job_link}
+    job_data['job_description'] = job_data_ret['job_description']
+    job_data['seniority_level'] = job_data_ret.get('Seniority level', 'Not Found')
+    job_data['employment_type'] = job_data_ret.get('Employment type', 'Not Found')
+    job_data['job_function'] = job_data_ret.get('Job function', 'Not Found')
+    job_data['industries'] = job_data_ret.get('Industries', 'Not Found')
+    return job_data
 
 
 @dataclass 
@@ -20,6 +108,45 @@ class JD_GetterConfig:
     max_retries: int = 3
     retry_wait_time: int = 5
     
+    # number of pending jobs fetched from the DB at a time (None for the chunk size of the DB)
+    page_size: int = None
+    
+    # "sequential" fetches, parses and stores one job at a time, "concurrent" overlaps them in worker threads,
+    # "queue" leases jobs from the jd_queue table so that several processes can share the backlog
+    mode: str = "sequential"
+    fetch_workers: int = 4
+    parse_workers: int = 2
+    queue_size: int = 100  # maximum jobs waiting between two stages
+    write_batch_size: int = 20
+    
+    # queue mode
+    claim_batch_size: int = 10  # jobs leased at a time
+    lease_seconds: int = 600  # renewed before each job of a claimed batch, leases not renewed by then are handed to other workers
+    
+    # http transport
+    connect_timeout: float = 10
+    read_timeout: float = 30
+    max_page_size: int = 5 * 1024 * 1024  # pages bigger than this (in bytes) are rejected
+    
+    # parsing
+    # only build the description and the job criteria list instead of the whole page; unlike the full parse it reports
+    # a criteria value missing from its list item as "Not Found" instead of taking the next value found on the page
+    fast_parse: bool = False
+    html_parser: str = "html.parser"  # "lxml" is faster if installed, but can split malformed markup differently
+    
+    # adaptive pacing replaces the fixed wait_time / retry_wait_time sleeps: the rate starts at one request per wait_time,
+    # backs off exponentially (or as told by Retry-After) on 429/5xx and ramps back up to max_rate after sustained success
+    adaptive_pacing: bool = True
+    min_rate: float = 0.05  # requests per second
+    max_rate: float = 2.0
+    ramp_up_after: int = 20  # consecutive successes before increasing the rate
+    ramp_up_step: float = 0.1
+    max_backoff: float = 300  # seconds
+    log_pacing_every: int = 100  # requests between two pacing state log lines
+    
+    # compressed copies of the downloaded pages, to re-parse them later without the network (None to disable)
+    page_cache_dir: str = "./mount/jd_page_cache"
+    
     log_dir: str = "./mount/logs/jd_getter_logs"
     
 
@@ -42,35 +169,101 @@ class JD_Getter:
                 self.info_logger = logger
             else:
                 self.error_logger = logger
+                
+        # pooled keep-alive session, with a connection per fetch worker
+        self.http = HttpClient(
+            pool_size=max(self.config.fetch_workers, 1),
+            connect_timeout=self.config.connect_timeout,
+            read_timeout=self.config.read_timeout,
+            max_body_size=self.config.max_page_size
+        )
+        
+        self.page_cache = RawPageCache(self.config.page_cache_dir) if self.config.page_cache_dir else None
+        
+        self.pacer = None
+        if self.config.adaptive_pacing:
+            self.pacer = AdaptivePacer(
+                initial_rate=1 / self.config.wait_time if self.config.wait_time else self.config.max_rate,
+                min_rate=self.config.min_rate,
+                max_rate=self.config.max_rate,
+                ramp_up_after=self.config.ramp_up_after,
+                ramp_up_step=self.config.ramp_up_step,
+                base_backoff=self.config.retry_wait_time,
+                max_backoff=self.config.max_backoff
+            )
+            # read on every scrape, next to the retries and failures counters
+            METRICS.register_gauge("pacing_rate", lambda: self.pacer.state()["rate"], collector="jd")
+            METRICS.register_gauge("backoff_remaining_seconds", lambda: self.pacer.state()["backoff_remaining"], collector="jd")
+            METRICS.register_gauge("consecutive_throttles", lambda: self.pacer.state()["consecutive_throttles"], collector="jd")
+        self.requests_made = 0
             
         
     
     def extract_job_tags(self, soup: BeautifulSoup):
-        details = {}
-        
-        # Look for specific labels
-        labels_to_find = ["Seniority level", "Employment type", "Job function", "Industries"]
-        
-        for label in labels_to_find:
-            # Find the label in the section
-            label_element = soup.find("h3", string=re.compile(label))
-            if label_element:
-                # Find the next sibling containing the relevant data
-                value_element = label_element.find_next("span")
-                details[label] = value_element.get_text(strip=True) if value_element else "Not Found"
-                if details[label] == "Not Found":
-                    self.error_logger.warning(f"Value not found for {label} for {soup.find('link', rel='canonical')['href']}")
+        details, missing_values = extract_job_tags_by_label(soup)
+        for label in missing_values:
+            self.error_logger.warning(f"Value not found for {label} for {soup.find('link', rel='canonical')['href']}")
 
         return details
 
 
-    def get_job_posts(self, job_url: str):
+    def get_job_posts(self, job_url: str, job_id: str = None):
+        
+        content = self.fetch_job_page(job_url, job_id)
+        with METRICS.timer("parse_seconds", collector="jd"):
+            return self.parse_job_page(content, job_url)
+    
+    
+    def pacing_state(self) -> dict:
+        return self.pacer.state() if self.pacer else {"rate": 1 / self.config.wait_time if self.config.wait_time else None}
+    
+    
+    def fetch_job_page(self, job_url: str, job_id: str = None) -> bytes:
         
-        response = requests.get(job_url)
-        response.raise_for_status()
-        soup = BeautifulSoup(response.content, 'html.parser')
+        if self.pacer:
+            with METRICS.timer("sleep_seconds", collector="jd", reason="pacing"):
+                started_at = self.pacer.wait()
+        try:
+            with METRICS.timer("fetch_seconds", collector="jd"):
+                content, timing = self.http.get(job_url)
+        except requests.HTTPError as e:
+            METRICS.inc("requests_total", collector="jd", status=e.response.status_code if e.response is not None else "error")
+            if self.pacer and e.response is not None and e.response.status_code in THROTTLE_STATUSES:
+                delay = self.pacer.on_throttle(parse_retry_after(e.response.headers.get("Retry-After")), started_at=started_at)
+                METRICS.inc("throttles_total", collector="jd", status=e.response.status_code)
+                self.error_logger.warning(f"Got {e.response.status_code} for {job_url}, backing off for {delay:.1f}s, pacing: {self.pacer.state()}")
+            raise
+        except Exception:
+            METRICS.inc("requests_total", collector="jd", status="error")
+            raise
+        finally:
+            self.requests_made += 1
+            if self.pacer and self.requests_made % self.config.log_pacing_every == 0:
+                self.info_logger.info(f"Pacing state: {self.pacer.state()}")
+        METRICS.inc("requests_total", collector="jd", status=200)
+        if self.pacer:
+            self.pacer.on_success()
+        if self.page_cache and job_id:
+            self.page_cache.put(job_id, job_url, content)
+        self.info_logger.info(f"Fetched {job_url} in {timing.time_to_headers:.3f}s + {timing.transfer_time:.3f}s "
+                              f"({timing.size} bytes, {'new' if timing.new_connection else 'reused'} connection)")
+        return content
+    
+    
+    def parse_job_page(self, content: bytes, job_url: str):
+        
+        if self.config.fast_parse:
+            job_post, missing_values = parse_job_html(content, self.config.html_parser)
+            for label in missing_values:
+                self.error_logger.warning(f"Value not found for {label} for {job_url}")
+            if job_post is None:
+                self.error_logger.error(f"Job post not found at {job_url}")
+                raise ValueError(f"Job post not found at {job_url}")
+            return job_post
         
-        section = soup.find("div", class_="show-more-less-html__markup show-more-less-html__markup--clamp-after-5 relative overflow-hidden")
+        soup = BeautifulSoup(content, self.config.html_parser)
+        
+        section = soup.find("div", class_=DESCRIPTION_CLASS)
         
         if section:
             # Extract heading-tagged content
@@ -86,35 +279,234 @@ class JD_Getter:
             raise ValueError(f"Job post not found at {job_url}")
         
         
+    def collect_job(self, job_id: str, job_link: str) -> bool:
+        retries = 0
+        while retries < self.config.max_retries:
+            try:
+                job_data_ret = self.get_job_posts(job_link, job_id)
+                self.db.insert_job(make_job_data(job_id, job_link, job_data_ret))
+                self.info_logger.info(f"Job post collected for {job_id}")
+                METRICS.inc("jobs_collected_total", collector="jd")
+                break
+            except Exception as e:
+                retries += 1
+                error_tag = e if isinstance(e, str) else str(e)
+                if not self.pacer:
+                    with METRICS.timer("sleep_seconds", collector="jd", reason="retry_wait"):
+                        time.sleep(self.config.retry_wait_time)
+                
+        if retries >= self.config.max_retries:    
+            self.error_logger.error(f"Error collecting job post for {job_id}: {error_tag}")
+            METRICS.inc("failures_total", collector="jd")
+            return False
+        METRICS.inc("retries_total", retries, collector="jd")
+            
+        if not self.pacer:
+            with METRICS.timer("sleep_seconds", collector="jd", reason="wait"):
+                time.sleep(self.config.wait_time)
+        return True
+        
+        
     def run(self):
+        if self.config.mode == "concurrent":
+            return self.run_concurrent()
+        elif self.config.mode == "queue":
+            return self.run_queue()
+        elif self.config.mode != "sequential":
+            raise ValueError(f"Unknown JD_Getter mode: {self.config.mode}")
+        
+        self.info_logger.info("Starting job post collection")
+        # only the jobs not collected yet, streamed page by page
+        for job_id, job_link in tqdm(self.db.get_pending_jobs(self.config.page_size)):
+            self.collect_job(job_id, job_link)
+            
+        self.info_logger.info(f"HTTP stats: {self.http.summary()}, pacing: {self.pacing_state()}")
+        self.info_logger.info("All job posts collected")
+            
+            
+    def run_concurrent(self):
+        self.info_logger.info(f"Starting concurrent job post collection with {self.config.fetch_workers} fetch workers")
+        
+        # a single bucket shared by all the fetch workers keeps the overall request rate at one per wait_time
+        # (the adaptive pacer, when enabled, already plays this role inside fetch_job_page)
+        self.limiter = TokenBucket(rate=1 / self.config.wait_time) if self.config.wait_time and not self.pacer else None
+        self.fetch_queue = queue.Queue(maxsize=self.config.queue_size)
+        self.retry_queue = deque()
+        self.parse_queue = queue.Queue(maxsize=self.config.queue_size)
+        self.write_queue = queue.Queue(maxsize=self.config.queue_size)
+        self.stop_event = threading.Event()
+        self.in_flight = 0
+        self.in_flight_cond = threading.Condition()
+        self.progress = tqdm()
+        for name, stage_queue in [("fetch", self.fetch_queue), ("parse", self.parse_queue), ("write", self.write_queue)]:
+            METRICS.register_gauge("queue_depth", stage_queue.qsize, queue=name)
+        METRICS.register_gauge("queue_depth", lambda: len(self.retry_queue), queue="retry")
+        METRICS.register_gauge("jobs_in_flight", lambda: self.in_flight, collector="jd")
+        
+        workers = [threading.Thread(target=self._fetch_worker, daemon=True) for _ in range(self.config.fetch_workers)]
+        workers += [threading.Thread(target=self._parse_worker, daemon=True) for _ in range(self.config.parse_workers)]
+        workers += [threading.Thread(target=self._write_worker, daemon=True)]
+        for worker in workers:
+            worker.start()
+        
+        try:
+            # the pending jobs are streamed on their own connection, self.db is only used by the write worker
+            for job in self.db.iter_pending_jobs(self.config.page_size):
+                with self.in_flight_cond:
+                    self.in_flight += 1
+                self.fetch_queue.put((job, 0))
+            
+            with self.in_flight_cond:
+                self.in_flight_cond.wait_for(lambda: self.in_flight == 0)
+        finally:
+            self.stop_event.set()
+            for worker in workers:
+                worker.join()
+            self.progress.close()
+            
+        self.info_logger.info(f"HTTP stats: {self.http.summary()}, pacing: {self.pacing_state()}")
+        self.info_logger.info("All job posts collected")
+        
+        
+    def _job_done(self):
+        self.progress.update(1)
+        with self.in_flight_cond:
+            self.in_flight -= 1
+            self.in_flight_cond.notify_all()
+            
+            
+    def _put(self, stage_queue: queue.Queue, item):
+        # gives up only when the run is aborted, so that no worker stays blocked on a full queue
+        while not self.stop_event.is_set():
+            try:
+                stage_queue.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+            
+            
+    def _retry_or_give_up(self, job: ScrolledJob, attempt: int, error: Exception):
+        if attempt + 1 < self.config.max_retries:
+            METRICS.inc("retries_total", collector="jd")
+            # re-queued after retry_wait_time without holding up the worker
+            timer = threading.Timer(self.config.retry_wait_time, self.retry_queue.append, args=((job, attempt + 1),))
+            timer.daemon = True
+            timer.start()
+        else:
+            self.error_logger.error(f"Error collecting job post for {job.job_id}: {error}")
+            METRICS.inc("failures_total", collector="jd")
+            self._job_done()
+            
+    
+    def _fetch_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                job, attempt = self.retry_queue.popleft()
+            except IndexError:
+                try:
+                    job, attempt = self.fetch_queue.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+            
+            if self.limiter:
+                with METRICS.timer("sleep_seconds", collector="jd", reason="pacing"):
+                    self.limiter.acquire()
+            try:
+                content = self.fetch_job_page(job.job_link, job.job_id)
+            except Exception as e:
+                self._retry_or_give_up(job, attempt, e)
+                continue
+            self._put(self.parse_queue, (job, attempt, content))
+            
+            
+    def _parse_worker(self):
+        while not self.stop_event.is_set():
+            try:
+                job, attempt, content = self.parse_queue.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            
+            try:
+                with METRICS.timer("parse_seconds", collector="jd"):
+                    job_data_ret = self.parse_job_page(content, job.job_link)
+            except Exception as e:
+                # a page without the job post may be a transient error page, so it is fetched again
+                self._retry_or_give_up(job, attempt, e)
+                continue
+            self._put(self.write_queue, make_job_data(job.job_id, job.job_link, job_data_ret))
+            
+            
+    def _write_worker(self):
+        batch = []
+        while not (self.stop_event.is_set() and self.write_queue.empty()):
+            try:
+                batch.append(self.write_queue.get(timeout=0.1))
+                if len(batch) < self.config.write_batch_size:
+                    continue
+            except queue.Empty:
+                if not batch:
+                    continue
+            
+            try:
+                self.db.insert_jobs(batch)
+                for job_data in batch:
+                    self.info_logger.info(f"Job post collected for {job_data['job_id']}")
+                METRICS.inc("jobs_collected_total", len(batch), collector="jd")
+            except Exception as e:
+                for job_data in batch:
+                    self.error_logger.error(f"Error saving job post for {job_data['job_id']}: {e}")
+                METRICS.inc("failures_total", len(batch), collector="jd")
+            for _ in batch:
+                self._job_done()
+            batch = []
+
+            
+            
+    def run_queue(self):
+        owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.info_logger.info(f"Starting queued job post collection as {owner}")
+        
+        queued = self.db.enqueue_pending_jobs()
+        self.info_logger.info(f"Queued {queued} new jobs, queue state: {self.db.get_jd_queue_counts()}")
+        
+        progress = tqdm()
         while True:
-            self.info_logger.info("Starting job post collection")
-            jobs_db = self.db.get_all_scrolled_jobs()
-            for job_link, job_id in tqdm(jobs_db.values):
-                retries = 0
-                while not self.db.check_if_job_already_scraped(job_id) and retries < self.config.max_retries:
-                    try:
-                        job_data_ret = self.get_job_posts(job_link)
-                        job_data = {"job_id": job_id, "job_link": job_link}
-                        job_data['job_description'] = job_data_ret['job_description']
-                        job_data['seniority_level'] = job_data_ret.get('Seniority level', 'Not Found')
-                        job_data['employment_type'] = job_data_ret.get('Employment type', 'Not Found')
-                        job_data['job_function'] = job_data_ret.get('Job function', 'Not Found')
-                        job_data['industries'] = job_data_ret.get('Industries', 'Not Found')
-                        self.db.insert_job(job_data)
-                        self.info_logger.info(f"Job post collected for {job_id}")
-                    except Exception as e:
-                        retries += 1
-                        error_tag = e if isinstance(e, str) else str(e)
+            with METRICS.timer("db_queue_seconds", op="claim"):
+                jobs = self.db.claim_jd_jobs(owner, self.config.claim_batch_size, self.config.lease_seconds, self.config.max_retries)
+            # one count per claimed batch, next to the page fetches it is negligible
+            counts = self.db.get_jd_queue_counts()
+            for state, count in counts.items():
+                METRICS.set_gauge("queue_depth", count, queue=f"jd_queue_{state}")
+            if not jobs:
+                if counts["pending"] or counts["leased"] or counts["failed_retryable"]:
+                    # jobs waiting for their next attempt or leased by other workers
+                    with METRICS.timer("sleep_seconds", collector="jd", reason="queue_wait"):
                         time.sleep(self.config.retry_wait_time)
-                        
-                if retries >= self.config.max_retries:    
-                    self.error_logger.error(f"Error collecting job post for {job_id}: {error_tag}")
-                        
-                else:
                     continue
-                    
-                time.sleep(self.config.wait_time)
-            else:
-                self.info_logger.info("All job posts collected")
-                break
\ No newline at end of file
+                break
+            
+            for position, job in enumerate(jobs):
+                # the batch can take longer than one lease under backoff, so the jobs still ahead are renewed one at a time
+                with METRICS.timer("db_queue_seconds", op="renew"):
+                    self.db.renew_jd_leases(owner, [queued.job_id for queued in jobs[position:]], self.config.lease_seconds)
+                try:
+                    job_data_ret = self.get_job_posts(job.job_link, job.job_id)
+                    self.db.insert_jobs([make_job_data(job.job_id, job.job_link, job_data_ret)])
+                    self.db.complete_jd_job(job.job_id, owner)
+                    self.info_logger.info(f"Job post collected for {job.job_id}")
+                    METRICS.inc("jobs_collected_total", collector="jd")
+                except Exception as e:
+                    permanent = job.attempts >= self.config.max_retries
+                    retry_after = self.config.retry_wait_time * 2 ** (job.attempts - 1)
+                    self.db.fail_jd_job(job.job_id, owner, str(e), permanent=permanent, retry_after=retry_after)
+                    if permanent:
+                        self.error_logger.error(f"Error collecting job post for {job.job_id}: {e}")
+                    METRICS.inc("failures_total" if permanent else "retries_total", collector="jd")
+                progress.update(1)
+                if not self.pacer:
+                    with METRICS.timer("sleep_seconds", collector="jd", reason="wait"):
+                        time.sleep(self.config.wait_time)
+        progress.close()
+                
+        self.info_logger.info(f"HTTP stats: {self.http.summary()}, pacing: {self.pacing_state()}")
+        self.info_logger.info(f"All job posts collected, queue state: {self.db.get_jd_queue_counts()}")
@@ -2,19 +2,61 @@ from selenium import webdriver
 from selenium.webdriver.common.by import By
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
 import time
 import random
 import os
+import json
+import re
 import logging
+from datetime import datetime, timedelta
 from pathlib import Path
 from dataclasses import dataclass, field
+from typing import Callable, List
 from bs4 import BeautifulSoup
 import pandas as pd
 
 from job_post_collector.db import DB
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.driver_pool import ChromeDriverPool
+from job_post_collector.card_log import CardLog
+from job_post_collector.metrics import METRICS
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
 
 
 
+@dataclass
+class BrowserProfile:
+    
+    # Only the job cards DOM is needed, so by default the browser runs without a window and skips heavy resources
+    headless: bool = True
+    window_size: str = "1366,900"
+    block_images: bool = True
+    block_media: bool = True
+    block_fonts: bool = True
+    disable_gpu: bool = True
+    disable_extensions: bool = True
+    disk_cache_size: int = 16 * 1024 * 1024 # bytes
+    media_cache_size: int = 1024 * 1024 # bytes
+    
+    @property
+    def blocked_url_patterns(self) -> list:
+        patterns = []
+        if self.block_images:
+            patterns += ["*.png", "*.jpg", "*.jpeg", "*.gif", "*.webp", "*.svg", "*.ico", "*media.licdn.com/dms/image*"]
+        if self.block_media:
+            patterns += ["*.mp4", "*.webm", "*.mp3", "*.m3u8", "*.ogg"]
+        if self.block_fonts:
+            patterns += ["*.woff", "*.woff2", "*.ttf", "*.otf"]
+        return patterns
+    
+    
+
 @dataclass
 class SearchConfig:
     
@@ -27,51 +69,206 @@ class SearchConfig:
     
     base_url: str = "https://www.linkedin.com/jobs/search?"
     
+    # "browser" scrolls the search page in Chrome, "http" pages through the fragments loaded by its 'See more jobs' button
+    backend: str = "browser"
+    api_base_url: str = "https://www.linkedin.com/jobs-guest/jobs/api/seeMoreJobPostings/search?"
+    
     save_every: int = 10 # Save the results every 10 scroll iterations
     base_save_dir: str = "./mount/scrape_scroll_saves"
+    log_dir: str = "./mount/logs/scroller_logs"
+    
+    # Checkpoints append the new job cards to a compressed log, from which an interrupted search is resumed
+    card_log: bool = True
+    resume_max_age_hours: float = 24 # Older interrupted searches start over
+    save_html_snapshots: bool = False # Also write the whole page to `save_file` at every checkpoint
+    
+    # Extract only the newly rendered job cards in the browser instead of saving and re-parsing the whole page
+    incremental_extraction: bool = True
+    
+    # Jobs already collected by earlier runs or searches (see `KnownJobsIndex`)
+    skip_known_jobs: bool = True # Store only a compact sighting of an already known job, not its whole card again
+    stop_after_stale_batches: int = 3 # Stop after these many consecutive saves without a new job (0 to never stop early)
+    
+    max_run_attempts: int = 5 # Give up the search after these many browser errors
+    
+    browser_profile: BrowserProfile = field(default_factory=BrowserProfile) # (pooled browsers use the profile given to the pool)
+    
+    # "fixed" sleeps 12-14s after each 'See more jobs' click and 12-24s at the bottom of the page,
+    # "event" moves on as soon as new cards or a taller page show up, but never before min_wait_interval
+    wait_mode: str = "event"
+    min_wait_interval: float = 4 # seconds
+    max_wait_timeout: float = 24 # seconds
     
     @property
     def get_url(self):
         return f"{self.base_url}keywords={self.Keywords}&location={self.Location}&f_TPR=r{self.Time}"
     
+    def get_api_url(self, start: int) -> str:
+        return f"{self.api_base_url}keywords={self.Keywords}&location={self.Location}&f_TPR=r{self.Time}&start={start}"
+    
+    @property
+    def resume_key(self) -> str:
+        # same for every run of the same search, unlike search_id
+        return re.sub(r"[^\w+\-]", "_", f"{self.Keywords}_{self.Location}_r{self.Time}")
+    
     @property
     def save_file(self) -> Path: 
         return Path(os.path.join(self.base_save_dir, f"{self.search_id}.html"))
     
     
     
+PAGE_STATE_JS = "return [document.querySelectorAll('div.base-card').length, document.body.scrollHeight];"
+
+
+# Returns the fields of the job cards not extracted so far and marks them as extracted,
+# mirroring the lookups done with BeautifulSoup in `JobScroller.scrape_job_info_from_html`
+EXTRACT_NEW_CARDS_JS = """
+const text = (card, selector) => {
+    const el = card.querySelector(selector);
+    return el ? el.textContent.trim() : "N/A";
+};
+const cards = document.querySelectorAll("div.base-card:not([data-jpc-extracted])");
+const records = [];
+for (const card of cards) {
+    const link_tag = card.querySelector("a.base-card__full-link");
+    records.push({
+        job_title: text(card, "h3.base-search-card__title"),
+        company: text(card, "h4.base-search-card__subtitle"),
+        location: text(card, "span.job-search-card__location"),
+        time_of_posting: text(card, "time"),
+        job_link: link_tag && link_tag.hasAttribute("href") ? link_tag.getAttribute("href").trim() : "N/A"
+    });
+    card.setAttribute("data-jpc-extracted", "1");
+}
+return JSON.stringify(records);
+"""
+
+
+def get_job_id(job_link: str) -> str:
+    return job_link.split("https://in.linkedin.com/jobs/view/")[-1].split("?")[0]
+
+
+def get_chrome_driver(profile: BrowserProfile = None):
+    options = Options()
+    options.add_experimental_option("excludeSwitches", ["enable-automation"])
+    options.add_experimental_option('useAutomationExtension', False)
+    options.add_argument("--disable-blink-features=AutomationControlled")
+    # the network events are read back to measure the bytes transferred by each search
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+    
+    if profile is not None:
+        if profile.headless:
+            options.add_argument("--headless=new")
+        options.add_argument(f"--window-size={profile.window_size}")
+        if profile.disable_gpu:
+            options.add_argument("--disable-gpu")
+        if profile.disable_extensions:
+            options.add_argument("--disable-extensions")
+        options.add_argument(f"--disk-cache-size={profile.disk_cache_size}")
+        options.add_argument(f"--media-cache-size={profile.media_cache_size}")
+        if profile.block_images:
+            options.add_argument("--blink-settings=imagesEnabled=false")
+            options.add_experimental_option("prefs", {"profile.managed_default_content_settings.images": 2})
+    
+    service = Service()
+    driver = webdriver.Chrome(service=service, options=options)
+    
+    if profile is not None and profile.blocked_url_patterns:
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": profile.blocked_url_patterns})
+    
+    return driver
+
+
+def get_browser_rss(driver) -> int:
+    # resident memory of chromedriver and every browser process it started, None without psutil
+    if psutil is None:
+        return None
+    try:
+        process = psutil.Process(driver.service.process.pid)
+        return sum(p.memory_info().rss for p in [process] + process.children(recursive=True))
+    except (psutil.Error, AttributeError):
+        return None
+    
+    
 class JobScroller:
     def __init__(self, 
                  config: SearchConfig,
-                 db: DB):
+                 db: DB,
+                 known_jobs: KnownJobsIndex = None,
+                 driver_pool: ChromeDriverPool = None,
+                 job_sink: Callable[[List[dict]], None] = None):
         
         self.config = config
         self.db = db
-        self.added_jobs_ids = []
+        self.known_jobs = known_jobs if known_jobs is not None else KnownJobsIndex()
+        self.job_sink = job_sink  # receives the newly stored jobs, e.g. to collect their descriptions right away
+        self.added_jobs_ids = set()
+        self.extracted_cards_count = 0
+        self.stale_batches = 0
+        self.completed = False  # set once the search ran to its end, rather than giving up
+        self.reached_end = False  # set when it went through all of its results, rather than stopping early
+        self.resume_cards = 0
+        self.card_log = CardLog(self.config.base_save_dir, self.config.resume_key) if self.config.card_log else None
+        self.bytes_transferred = 0
+        self.peak_browser_rss = None
+        self.wait_times = {"scroll_pause": 0.0, "see_more": 0.0, "bottom": 0.0}
         
-        # setup the chrome driver
-        self.driver = self._get_chrome_driver()
+        # setup the chrome driver (a pooled driver is only taken for the duration of `run`)
+        self.driver_pool = driver_pool
+        self.driver = None if driver_pool else self._get_chrome_driver()
         
-        # setup the logger
-        fh = logging.FileHandler(Path(f'./mount/logs/scroller_logs/{self.config.search_id}.log'))
-        fh.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
-        self.logger = logging.getLogger('job_scroller')
-        self.logger.setLevel(logging.INFO)
-        self.logger.addHandler(fh)
+        # setup the logger (a single one for every search, which the loggers registry keeps for the process lifetime,
+        # each search's file only takes the records of its own search, so that concurrent searches don't write to each other's files)
+        self.log_handler = logging.FileHandler(Path(os.path.join(self.config.log_dir, f"{self.config.search_id}.log")))
+        self.log_handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s.%(search_id)s - %(levelname)s - %(message)s'))
+        self.log_handler.addFilter(lambda record: getattr(record, "search_id", None) == self.config.search_id)
+        logger = logging.getLogger('job_scroller')
+        logger.setLevel(logging.INFO)
+        logger.addHandler(self.log_handler)
+        self.logger = logging.LoggerAdapter(logger, {"search_id": self.config.search_id})
         
         self.logger.info(f"Job Scroller initialized for search_id: {self.config.search_id}")
         
         
     def _get_chrome_driver(self):
-        options = Options()
-        options.add_experimental_option("excludeSwitches", ["enable-automation"])
-        options.add_experimental_option('useAutomationExtension', False)
-        options.add_argument("--disable-blink-features=AutomationControlled")
-        
-        service = Service()
-        driver = webdriver.Chrome(service=service, options=options)
-        
-        return driver
+        return get_chrome_driver(self.config.browser_profile)
+    
+    
+    def _update_browser_stats(self):
+        # drains the network events logged since the last call
+        try:
+            for entry in self.driver.get_log("performance"):
+                if '"Network.loadingFinished"' in entry["message"]:
+                    self.bytes_transferred += json.loads(entry["message"])["message"]["params"].get("encodedDataLength", 0)
+        except Exception as e:
+            self.logger.warning(f"Could not read the browser network events: {e}")
+        rss = get_browser_rss(self.driver)
+        if rss is not None:
+            self.peak_browser_rss = max(self.peak_browser_rss or 0, rss)
+    
+    
+    def _release_driver(self, broken: bool = False):
+        if self.driver is None:
+            return
+        if self.driver_pool:
+            self.driver_pool.release(self.driver, broken=broken)
+        else:
+            try:
+                self.driver.quit()
+            except Exception:
+                # the browser may already be gone after a crash
+                pass
+        self.driver = None
+    
+    
+    @property
+    def outcome(self) -> str:
+        # "reached_end" when the search went through all of its results, "cut_short" when it stopped early
+        # (max_jobs, stale batches), "failed" when it gave up
+        if not self.completed:
+            return "failed"
+        return "reached_end" if self.reached_end else "cut_short"
     
     
     def save_results(self):
@@ -80,6 +277,27 @@ class JobScroller:
         self.logger.info(f"Results saved to {self.config.save_file}")
             
     
+    def wait_for_new_content(self, reason: str, fixed_wait: tuple, state_before: list = None):
+        start = time.monotonic()
+        if self.config.wait_mode == "event":
+            state_before = state_before or self.driver.execute_script(PAGE_STATE_JS)
+            try:
+                WebDriverWait(self.driver, self.config.max_wait_timeout, poll_frequency=0.5).until(
+                    lambda driver: driver.execute_script(PAGE_STATE_JS) != state_before
+                )
+            except TimeoutException:
+                pass
+            # never faster than the configured floor, even when the content is already there
+            remaining = self.config.min_wait_interval - (time.monotonic() - start)
+            if remaining > 0:
+                time.sleep(remaining)
+        else:
+            time.sleep(random.uniform(*fixed_wait))
+        elapsed = time.monotonic() - start
+        self.wait_times[reason] += elapsed
+        METRICS.observe("sleep_seconds", elapsed, collector="scroller", reason=reason)
+        
+        
     def slow_human_like_scroll(self):
         current_scroll_position = 0
         scroll_increment = random.randint(200, 400)  # Scroll a random distance between 200 and 400 pixels
@@ -91,15 +309,19 @@ class JobScroller:
             current_scroll_position += scroll_increment
             
             # Random pauses to mimic human scrolling behavior
-            time.sleep(random.uniform(0.05, 0.5))  # Wait between 1.5 and 3 seconds
+            pause = random.uniform(0.05, 0.5)
+            time.sleep(pause)
+            self.wait_times["scroll_pause"] += pause
+            METRICS.observe("sleep_seconds", pause, collector="scroller", reason="scroll_pause")
 
             # Try to click the "See more jobs" button if it exists
             try:
                 see_more_button = self.driver.find_element(By.XPATH, "//button[contains(@class, 'infinite-scroller__show-more-button')]")
                 if see_more_button.is_displayed():
+                    state_before = self.driver.execute_script(PAGE_STATE_JS)
                     see_more_button.click()
                     self.logger.info("Clicked 'See more jobs' button.")
-                    time.sleep(random.uniform(12, 14))  # Wait for new jobs to load after clicking
+                    self.wait_for_new_content("see_more", (12, 14), state_before)  # Wait for new jobs to load after clicking
             except Exception as e:
                 self.logger.warning("No 'See more jobs' button found or error occurred:", e)
                 raise e
@@ -109,10 +331,11 @@ class JobScroller:
             # Break the loop if we've reached the bottom of the page
             new_scroll_height = self.driver.execute_script("return document.body.scrollHeight")
             if current_scroll_position >= new_scroll_height:
-                time.sleep(random.uniform(12, 24))
+                self.wait_for_new_content("bottom", (12, 24))
                 new_scroll_height = self.driver.execute_script("return document.body.scrollHeight")
                 if current_scroll_position >= new_scroll_height:
                     self.logger.warning("Reached the bottom of the page.")
+                    self.reached_end = True
                     break
             
             # Break the loop if max number of jobs collected
@@ -123,15 +346,73 @@ class JobScroller:
             # Save the results every n scroll iterations
             scroll_no += 1
             if scroll_no % self.config.save_every == 0:
-                self.save_results()
-                jobs_df = self.scrape_job_info_from_html()
-                self.save_to_db(jobs_df)
+                self.checkpoint()
+                
+                # Break the loop if the last few saves only found already known jobs
+                if self.config.stop_after_stale_batches and self.stale_batches >= self.config.stop_after_stale_batches:
+                    self.logger.warning(f"No new jobs in the last {self.stale_batches} saves. Stopping the scroller.")
+                    break
+                
+                
+    def checkpoint(self):
+        if self.config.save_html_snapshots:
+            self.save_results()
+        with METRICS.timer("parse_seconds", collector="scroller"):
+            if self.config.incremental_extraction:
+                jobs_df = self.scrape_new_job_cards()
+            else:
+                jobs_df = self.scrape_job_info_from_html(self.driver.page_source)
+                self.extracted_cards_count = len(jobs_df)
+        new_jobs = self.save_to_db(jobs_df)
+        self._update_stale_batches(new_jobs)
+        self._update_browser_stats()
+        
+        
+    def _update_stale_batches(self, new_jobs: int):
+        if new_jobs:
+            self.stale_batches = 0
+        elif self.extracted_cards_count > self.resume_cards:
+            # cards already logged before an interruption don't count as stale
+            self.stale_batches += 1
+            
+            
+    def resume_from_card_log(self):
+        if self.card_log is None:
+            return
+        cursor = self.card_log.load_cursor()
+        if cursor is None or cursor.get("completed") or \
+                datetime.fromisoformat(cursor["updated_at"]) < datetime.now() - timedelta(hours=self.config.resume_max_age_hours):
+            self.card_log.reset()
+            return
+        
+        records = list(self.card_log.read())
+        self.card_log.rewrite(records)
+        for record in records:
+            self.added_jobs_ids.add(record["job_id"])
+        self.resume_cards = cursor["cards"]
+        self.logger.info(f"Resuming interrupted search {cursor['search_id']} with {len(self.added_jobs_ids)} jobs from {self.card_log.log_file}")
+        
+        
+    def save_card_log(self, jobs: list, completed: bool = False):
+        if self.card_log is None:
+            return
+        self.card_log.append(jobs)
+        self.card_log.save_cursor(
+            search_id=self.config.search_id,
+            cards=max(self.extracted_cards_count, self.resume_cards),
+            jobs=len(self.added_jobs_ids),
+            completed=completed
+        )
                 
                 
-    def scrape_job_info_from_html(self) -> pd.DataFrame:
+    def scrape_job_info_from_html(self, html: str = None) -> pd.DataFrame:
         
-        with open(self.config.save_file, "r", encoding="utf-8") as file:
-            soup = BeautifulSoup(file, 'html.parser')
+        # parses the given markup, or the last saved page of the search
+        if html is not None:
+            soup = BeautifulSoup(html, 'html.parser')
+        else:
+            with open(self.config.save_file, "r", encoding="utf-8") as file:
+                soup = BeautifulSoup(file, 'html.parser')
             
         # Lists to store job data
         job_titles = []
@@ -172,7 +453,7 @@ class JobScroller:
             locations.append(location)
             post_times.append(post_time)
             links.append(link)
-            job_ids.append(link.split("https://in.linkedin.com/jobs/view/")[-1].split("?")[0])
+            job_ids.append(get_job_id(link))
 
         # Create a DataFrame
         jobs_df = pd.DataFrame({
@@ -191,30 +472,99 @@ class JobScroller:
         return jobs_df
     
     
-    def save_to_db(self, jobs_df: pd.DataFrame):
-        for _, row in jobs_df.iterrows():
-            if row['job_id'] in self.added_jobs_ids:
+    def scrape_new_job_cards(self) -> pd.DataFrame:
+        
+        records = json.loads(self.driver.execute_script(EXTRACT_NEW_CARDS_JS))
+        
+        jobs_df = pd.DataFrame(records, columns=["job_title", "company", "location", "time_of_posting", "job_link"])
+        jobs_df["job_id"] = [get_job_id(link) for link in jobs_df["job_link"]]
+        jobs_df["search_keyword"] = self.config.Keywords
+        jobs_df["search_location"] = self.config.Location
+        
+        self.extracted_cards_count += len(records)
+        self.logger.info(f"Extracted {len(records)} new job listings ({self.extracted_cards_count} in total till now).")
+        
+        return jobs_df
+    
+    
+    def save_to_db(self, jobs_df: pd.DataFrame) -> int:
+        jobs_seen = {}
+        for job in jobs_df.to_dict("records"):
+            if job['job_id'] in self.added_jobs_ids or job['job_id'] in jobs_seen:
                 continue
-            self.db.insert_scrolled_job(row.to_dict())
-            self.added_jobs_ids.append(row['job_id'])
+            jobs_seen[job['job_id']] = job
+        unknown_jobs = [job for job in jobs_seen.values() if job['job_id'] not in self.known_jobs]
+        known_jobs = [job for job in jobs_seen.values() if job['job_id'] in self.known_jobs]
+        
+        # every search finding a job is recorded (the planner and the search filters rely on it),
+        # duplicates from earlier runs of the same search are skipped by the unique key
+        if self.config.skip_known_jobs:
+            inserted = self.db.insert_scrolled_jobs(unknown_jobs, known_entries=known_jobs)
+        else:
+            inserted = self.db.insert_scrolled_jobs(list(jobs_seen.values()))
+        # marked as known and added only once stored, so that the jobs of a failed insert are saved again when the
+        # search is retried and aren't skipped by the other searches, and logged after the DB write,
+        # so a crash in between only leads to duplicates ignored by the DB.
+        # Only the first search to store a job passes it on for its description
+        new_jobs_to_collect = [job for job in unknown_jobs if self.known_jobs.add(job['job_id'])]
+        new_jobs = len(new_jobs_to_collect)
+        self.added_jobs_ids.update(jobs_seen)
+        self.save_card_log(list(jobs_seen.values()))
+        if self.job_sink and new_jobs_to_collect:
+            self.job_sink(new_jobs_to_collect)
             
-        self.logger.info(f"Scraped job listings saved to database.")
+        METRICS.inc("cards_seen_total", len(jobs_seen), collector="scroller")
+        METRICS.inc("jobs_found_total", new_jobs, collector="scroller")
+        self.logger.info(f"Scraped job listings saved to database ({new_jobs} new jobs, {inserted} new rows).")
+        return new_jobs
         
         
     def run(self):
         
-        while True:
-            try:
-                self.logger.info(f"Starting the job scroller for search_id: {self.config.search_id} and url: {self.config.get_url}")
-                self.driver.get(self.config.get_url)
-                self.slow_human_like_scroll()
-                
-                self.save_results()
-                jobs_df = self.scrape_job_info_from_html()
-                self.save_to_db(jobs_df)
-                self.logger.info(f"Job Scroller ended for search_id: {self.config.search_id}. Added {len(self.added_jobs_ids)} jobs.")
-                break
-            except Exception as e:
-                self.logger.error(f"Error occurred during scroller run: {e}")
-                self.driver = self._get_chrome_driver()
-            
\ No newline at end of file
+        attempts = 0
+        self.resume_from_card_log()
+        try:
+            while True:
+                started_at = time.monotonic()
+                self.wait_times = dict.fromkeys(self.wait_times, 0.0)
+                if self.driver is None:
+                    self.driver = self.driver_pool.acquire() if self.driver_pool else self._get_chrome_driver()
+                    # network events left over from a previous search on a pooled browser
+                    self._update_browser_stats()
+                    self.bytes_transferred = 0
+                try:
+                    self.logger.info(f"Starting the job scroller for search_id: {self.config.search_id} and url: {self.config.get_url}")
+                    with METRICS.timer("fetch_seconds", collector="scroller", backend="browser"):
+                        self.driver.get(self.config.get_url)
+                    # the page starts over from the top, cards up to the furthest point reached are already logged
+                    self.resume_cards = max(self.resume_cards, self.extracted_cards_count)
+                    self.extracted_cards_count = 0
+                    self.stale_batches = 0
+                    self.slow_human_like_scroll()
+                    
+                    self.checkpoint()
+                    self.completed = True
+                    METRICS.inc("searches_total", collector="scroller", outcome="completed")
+                    self.save_card_log([], completed=True)
+                    self.logger.info(f"Job Scroller ended for search_id: {self.config.search_id}. Added {len(self.added_jobs_ids)} jobs.")
+                    peak_rss = f"{self.peak_browser_rss / 2**20:.0f} MB" if self.peak_browser_rss is not None else "unknown (psutil not installed)"
+                    waits = ", ".join([f"{reason} {seconds:.1f}s" for reason, seconds in self.wait_times.items()])
+                    self.logger.info(f"Timing for search_id: {self.config.search_id} ({self.config.wait_mode} waits): "
+                                     f"{time.monotonic() - started_at:.1f}s elapsed, waits: {waits}")
+                    self.logger.info(f"Browser stats for search_id: {self.config.search_id}: {self.bytes_transferred / 2**20:.2f} MB transferred, peak RSS {peak_rss}")
+                    break
+                except Exception as e:
+                    self.logger.error(f"Error occurred during scroller run: {e}")
+                    # the browser is replaced instead of being left running
+                    self._release_driver(broken=True)
+                    attempts += 1
+                    if attempts >= self.config.max_run_attempts:
+                        self.logger.error(f"Giving up search_id: {self.config.search_id} after {attempts} attempts.")
+                        METRICS.inc("failures_total", collector="scroller")
+                        METRICS.inc("searches_total", collector="scroller", outcome="given_up")
+                        break
+                    METRICS.inc("retries_total", collector="scroller")
+        finally:
+            self._release_driver()
+            self.logger.logger.removeHandler(self.log_handler)
+            self.log_handler.close()
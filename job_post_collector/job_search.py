@@ -0,0 +1,114 @@
+import re
+from dataclasses import dataclass
+from typing import List
+
+
+# a "quoted phrase", a bracket (`-(` opens an excluded group), or a word (`pyth*` matches the words starting with pyth)
+_TOKEN = re.compile(r'"[^"]*"|-?\(|\)|[^\s()]+')
+
+
+@dataclass
+class QueryClause:
+
+    terms: List[str] # any of them matches the clause, phrases keep their quotes
+    exclude: bool = False
+
+
+def parse_search_query(query: str) -> List[QueryClause]:
+    # every term is required, `a OR b` (or a bracketed group `(a b)`) needs any of them,
+    # `-term` / `NOT term` excludes the descriptions containing it (`-(a b)` / `NOT (a b)` any of them), `AND` is optional
+    clauses = []
+    exclude = False
+    join_next = False
+    group, join_group = None, False
+    for token in _TOKEN.findall(query):
+        upper = token.upper()
+        if upper == "AND":
+            continue
+        if upper == "OR":
+            join_next = bool(clauses)
+            continue
+        if upper == "NOT":
+            if group is not None:
+                raise ValueError(f"Exclusions are not supported inside brackets, exclude the whole group instead: {query!r}")
+            exclude = True
+            continue
+        if token in ("(", "-("):
+            if group is not None:
+                raise ValueError(f"Nested brackets are not supported in the search query: {query!r}")
+            group, join_group = [], join_next
+            exclude = exclude or token == "-("
+            continue
+        if token == ")":
+            if group is None:
+                raise ValueError(f"Unmatched ')' in the search query: {query!r}")
+            if group and join_group and not exclude:
+                clauses[-1].terms += group
+            elif group:
+                clauses.append(QueryClause(group, exclude))
+            group, exclude, join_next = None, False, False
+            continue
+
+        if token == "-":
+            raise ValueError(f"A '-' needs a term or a bracket right after it in the search query: {query!r}")
+        if token.startswith("-"):
+            if group is not None:
+                raise ValueError(f"Exclusions are not supported inside brackets, exclude the whole group instead: {query!r}")
+            exclude, token = True, token[1:]
+        if group is not None:
+            group.append(token)
+        elif join_next and not exclude:
+            clauses[-1].terms.append(token)
+        else:
+            clauses.append(QueryClause([token], exclude))
+            exclude = False
+        join_next = False
+
+    if group is not None:
+        raise ValueError(f"Unclosed '(' in the search query: {query!r}")
+    if not any([not clause.exclude for clause in clauses]):
+        raise ValueError(f"The search query needs at least one term to match: {query!r}")
+    return clauses
+
+
+def _is_phrase(term: str) -> bool:
+    return term.startswith('"') and term.endswith('"') and len(term) > 1
+
+
+def to_mysql_boolean(clauses: List[QueryClause]) -> str:
+    # MATCH ... AGAINST (... IN BOOLEAN MODE) syntax: +required -excluded, a bracketed group for the alternatives
+    def term_text(term: str) -> str:
+        if _is_phrase(term):
+            return '"' + term[1:-1].replace('"', " ") + '"'
+        word, prefix = (term[:-1], "*") if term.endswith("*") else (term, "")
+        if re.fullmatch(r"\w+", word):
+            return word + prefix
+        # words with operator characters, such as c++ or node.js, are searched as phrases
+        return '"' + word.replace('"', " ") + '"'
+
+    parts = []
+    for clause in clauses:
+        terms = [term_text(term) for term in clause.terms]
+        operator = "-" if clause.exclude else "+"
+        parts.append(operator + (terms[0] if len(terms) == 1 else f"({' '.join(terms)})"))
+    return " ".join(parts)
+
+
+def to_fts5(clauses: List[QueryClause]) -> str:
+    # SQLite FTS5 MATCH syntax: "quoted" strings joined by AND / OR / NOT, a trailing * for the prefixes
+    def term_text(term: str) -> str:
+        if _is_phrase(term):
+            return '"' + term[1:-1].replace('"', '""') + '"'
+        word, prefix = (term[:-1], "*") if term.endswith("*") else (term, "")
+        return '"' + word.replace('"', '""') + '"' + prefix
+
+    def clause_text(clause: QueryClause) -> str:
+        terms = [term_text(term) for term in clause.terms]
+        return terms[0] if len(terms) == 1 else f"({' OR '.join(terms)})"
+
+    # NOT is binary in FTS5, the excluded clauses follow the required ones
+    query = " AND ".join([clause_text(clause) for clause in clauses if not clause.exclude])
+    for clause in clauses:
+        if clause.exclude:
+            query += f" NOT {clause_text(clause)}"
+    return query
@@ -0,0 +1,33 @@
+import threading
+from typing import Iterable
+
+from job_post_collector.db import DB
+
+
+class KnownJobsIndex:
+    def __init__(self, job_ids: Iterable[str] = ()):
+        
+        self.job_ids = set(job_ids)
+        self._lock = threading.Lock()
+        
+        
+    @classmethod
+    def from_db(cls, db: DB) -> "KnownJobsIndex":
+        return cls(db.iter_scrolled_job_ids())
+    
+    
+    def __contains__(self, job_id: str) -> bool:
+        return job_id in self.job_ids
+    
+    
+    def __len__(self) -> int:
+        return len(self.job_ids)
+    
+    
+    def add(self, job_id: str) -> bool:
+        # returns True if the job id was not known before
+        with self._lock:
+            if job_id in self.job_ids:
+                return False
+            self.job_ids.add(job_id)
+            return True
@@ -0,0 +1,257 @@
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+
+# upper bounds in seconds, from a fast parse up to a long backoff
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one counts the values above the largest bound
+        self.count = 0
+        self.sum = 0.0
+
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+
+    def quantile(self, q: float) -> float:
+        # upper bound of the bucket holding the quantile, the largest bound when it falls above them
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return self.buckets[-1]
+
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": self.sum / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+        }
+
+
+def _label_key(labels: dict) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join([f'{name}="{value}"' for name, value in pairs]) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+
+        # every update is a dict lookup and an addition under one lock, cheap next to a page fetch or a DB commit
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters: Dict[str, Dict[tuple, float]] = {}
+        self.histograms: Dict[str, Dict[tuple, Histogram]] = {}
+        self.gauges: Dict[str, Dict[tuple, Callable[[], float]]] = {}
+
+
+    def inc(self, name: str, value: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(seconds)
+
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started_at, **labels)
+
+
+    def register_gauge(self, name: str, getter: Callable[[], float], **labels):
+        # read only when the metrics are collected, e.g. the size of a queue
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = getter
+
+
+    def set_gauge(self, name: str, value: float, **labels):
+        self.register_gauge(name, lambda: value, **labels)
+
+
+    def unregister_gauge(self, name: str, **labels):
+        with self._lock:
+            self.gauges.get(name, {}).pop(_label_key(labels), None)
+
+
+    def _read_gauges(self) -> Dict[str, Dict[tuple, float]]:
+        with self._lock:
+            getters = {name: dict(series) for name, series in self.gauges.items()}
+        values = {}
+        for name, series in getters.items():
+            for key, getter in series.items():
+                try:
+                    values.setdefault(name, {})[key] = getter()
+                except Exception:
+                    # a gauge reading a closed queue or connection is skipped
+                    continue
+        return values
+
+
+    def snapshot(self) -> dict:
+        gauges = self._read_gauges()
+        with self._lock:
+            uptime = time.time() - self.started_at
+            counters = {name: dict(series) for name, series in self.counters.items()}
+            histograms = {name: {key: histogram.to_dict() for key, histogram in series.items()}
+                          for name, series in self.histograms.items()}
+
+        def series_list(series: dict, value_name: str) -> list:
+            return [{"labels": dict(key), value_name: value} for key, value in series.items()]
+
+        return {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "uptime_seconds": round(uptime, 1),
+            "counters": {name: [{**item, "per_minute": item["value"] * 60 / uptime if uptime else 0.0}
+                                for item in series_list(series, "value")]
+                         for name, series in counters.items()},
+            "histograms": {name: [{"labels": dict(key), **stats} for key, stats in series.items()]
+                           for name, series in histograms.items()},
+            "gauges": {name: series_list(series, "value") for name, series in gauges.items()},
+        }
+
+
+    def to_prometheus(self) -> str:
+        gauges = self._read_gauges()
+        lines = []
+        with self._lock:
+            for name, series in self.counters.items():
+                lines.append(f"# TYPE {name} counter")
+                lines += [f"{name}{_format_labels(key)} {value}" for key, value in series.items()]
+            for name, series in self.histograms.items():
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in series.items():
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets, histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {cumulative}")
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {histogram.count}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        for name, series in gauges.items():
+            lines.append(f"# TYPE {name} gauge")
+            lines += [f"{name}{_format_labels(key)} {value}" for key, value in series.items()]
+        return "\n".join(lines) + "\n"
+
+
+    def write_snapshot(self, path: str):
+        path = Path(path)
+        tmp_file = path.with_suffix(".tmp")
+        with open(tmp_file, "w", encoding="utf-8") as file:
+            json.dump(self.snapshot(), file, indent=4)
+        os.replace(tmp_file, path)
+
+
+# shared by the collectors and the DB of a process, like the loggers
+METRICS = MetricsRegistry()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    registry: MetricsRegistry = METRICS
+
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = self.registry.to_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, content_type = json.dumps(self.registry.snapshot()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class MetricsExporter:
+    def __init__(self,
+                 registry: MetricsRegistry = METRICS,
+                 port: int = None,
+                 host: str = "127.0.0.1",
+                 snapshot_file: str = None,
+                 snapshot_every: float = 60):
+
+        # serves /metrics (prometheus text) and /metrics.json on a local port,
+        # and/or writes the JSON snapshot to a file every `snapshot_every` seconds
+        self.registry = registry
+        self.snapshot_file = snapshot_file
+        self.snapshot_every = snapshot_every
+        self.stop_event = threading.Event()
+        self.server = None
+        self.threads = []
+
+        if port is not None:
+            handler = type("MetricsHandler", (_MetricsHandler,), {"registry": registry})
+            self.server = ThreadingHTTPServer((host, port), handler)
+            self.server.daemon_threads = True
+            self.threads.append(threading.Thread(target=self.server.serve_forever, daemon=True))
+        if snapshot_file is not None:
+            os.makedirs(Path(snapshot_file).parent, exist_ok=True)
+            self.threads.append(threading.Thread(target=self._write_snapshots, daemon=True))
+
+
+    def _write_snapshots(self):
+        while not self.stop_event.wait(self.snapshot_every):
+            self.registry.write_snapshot(self.snapshot_file)
+
+
+    def start(self) -> "MetricsExporter":
+        for thread in self.threads:
+            thread.start()
+        return self
+
+
+    def stop(self):
+        self.stop_event.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+        if self.snapshot_file is not None:
+            # the final state of the run
+            self.registry.write_snapshot(self.snapshot_file)
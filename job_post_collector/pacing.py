@@ -0,0 +1,115 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+import random
+import threading
+import time
+
+from job_post_collector.rate_limiter import TokenBucket
+
+
+THROTTLE_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: str):
+    # Retry-After is either a number of seconds or an HTTP date
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+    
+    
+class AdaptivePacer:
+    def __init__(self,
+                 initial_rate: float,
+                 min_rate: float,
+                 max_rate: float,
+                 ramp_up_after: int = 20,
+                 ramp_up_step: float = 0.1,
+                 decrease_factor: float = 0.5,
+                 base_backoff: float = 5,
+                 max_backoff: float = 300):
+        
+        # the request rate grows by ramp_up_step after every ramp_up_after consecutive successes (up to max_rate)
+        # and is multiplied by decrease_factor on a throttled response (down to min_rate), once per throttle:
+        # the responses to the requests already in flight at that point are throttled by the same overload
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.ramp_up_after = ramp_up_after
+        self.ramp_up_step = ramp_up_step
+        self.decrease_factor = decrease_factor
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        
+        self.rate = min(max(initial_rate, min_rate), max_rate)
+        self.bucket = TokenBucket(self.rate)
+        self.blocked_until = 0.0
+        self.last_decrease_at = float("-inf")
+        self.consecutive_throttles = 0
+        self.successes_in_a_row = 0
+        self.total_throttles = 0
+        self._lock = threading.Lock()
+        
+        
+    def wait(self) -> float:
+        # a backoff pauses every thread sharing the pacer, then the requests are spread at the current rate,
+        # returns when the request was let through, for `on_throttle`
+        while True:
+            with self._lock:
+                delay = self.blocked_until - time.monotonic()
+            if delay <= 0:
+                break
+            time.sleep(delay)
+        self.bucket.acquire()
+        return time.monotonic()
+        
+        
+    def on_success(self):
+        with self._lock:
+            self.consecutive_throttles = 0
+            self.successes_in_a_row += 1
+            if self.successes_in_a_row >= self.ramp_up_after and self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.ramp_up_step)
+                self.bucket.set_rate(self.rate)
+                self.successes_in_a_row = 0
+                
+                
+    def on_throttle(self, retry_after: float = None, started_at: float = None) -> float:
+        # `started_at` is what `wait` returned for the throttled request, returns the time left to wait
+        with self._lock:
+            self.total_throttles += 1
+            self.successes_in_a_row = 0
+            now = time.monotonic()
+            if now < self.blocked_until or (started_at is not None and started_at < self.last_decrease_at):
+                # already backing off for this throttle, only a longer Retry-After still extends the pause
+                if retry_after is not None:
+                    self.blocked_until = max(self.blocked_until, now + retry_after)
+                return max(0.0, self.blocked_until - now)
+            
+            self.consecutive_throttles += 1
+            self.last_decrease_at = now
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.bucket.set_rate(self.rate)
+            
+            if retry_after is None:
+                # exponential backoff, with a random jitter of +-50% so that workers do not retry in lockstep
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.consecutive_throttles - 1))
+                retry_after = random.uniform(0.5, 1.5) * backoff
+            self.blocked_until = max(self.blocked_until, now + retry_after)
+            return retry_after
+        
+        
+    def state(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "backoff_remaining": round(max(0.0, self.blocked_until - time.monotonic()), 1),
+                "consecutive_throttles": self.consecutive_throttles,
+                "successes_in_a_row": self.successes_in_a_row,
+                "total_throttles": self.total_throttles
+            }
@@ -0,0 +1,63 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator
+
+
+class RawPageCache:
+    def __init__(self, base_dir: str = "./mount/jd_page_cache", compress_level: int = 6):
+        
+        # pages are stored once per distinct content under objects/<sha256[:2]>/<sha256[2:]>.gz,
+        # and index.ndjson records which content was fetched for which job and when
+        self.base_dir = Path(base_dir)
+        self.objects_dir = self.base_dir / "objects"
+        self.index_file = self.base_dir / "index.ndjson"
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        
+        os.makedirs(self.objects_dir, exist_ok=True)
+        
+        
+    def _object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / f"{digest[2:]}.gz"
+    
+    
+    def put(self, job_id: str, job_link: str, content: bytes) -> str:
+        
+        digest = hashlib.sha256(content).hexdigest()
+        path = self._object_path(digest)
+        if not path.exists():
+            os.makedirs(path.parent, exist_ok=True)
+            # written under a temporary name first so that readers never see a partial object
+            tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            with gzip.open(tmp_path, "wb", compresslevel=self.compress_level) as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        
+        record = {"job_id": job_id, "job_link": job_link, "sha256": digest, "fetched_at": datetime.now().isoformat(timespec="seconds")}
+        with self._lock:
+            with open(self.index_file, "a", encoding="utf-8") as file:
+                file.write(json.dumps(record) + "\n")
+        return digest
+    
+    
+    def get(self, digest: str) -> bytes:
+        with gzip.open(self._object_path(digest), "rb") as file:
+            return file.read()
+        
+        
+    def iter_latest(self) -> Iterator[dict]:
+        # the most recent fetch of every cached job
+        if not self.index_file.exists():
+            return
+        latest = {}
+        with open(self.index_file, "r", encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    record = json.loads(line)
+                    latest[record["job_id"]] = record
+        yield from latest.values()
@@ -0,0 +1,252 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from job_post_collector.db import DB
+
+
+# few distinct values repeated over many rows, stored once per row group with small integer codes
+LOW_CARDINALITY = pa.dictionary(pa.int32(), pa.string())
+
+
+@dataclass
+class ExportTable:
+
+    name: str
+    columns: List[Tuple[str, pa.DataType]]
+    key: List[str] # ordered unique columns the rows are read by, their last exported values are the watermark
+    start: list # watermark before the first export
+    date_column: str = "entry_date" # when the row was written, the files are partitioned by its day
+    source: str = None # FROM clause, the table itself by default
+    requires_sightings: bool = False # only exported once the sightings tables hold every scrolled job (see `DB.sightings_ready`)
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pa.schema(self.columns)
+
+    @property
+    def from_clause(self) -> str:
+        return self.source or self.name
+
+    @property
+    def dictionary_columns(self) -> List[str]:
+        return [name for name, data_type in self.columns if data_type == LOW_CARDINALITY]
+
+
+EXPORT_TABLES = {
+    "scrolled_jobs": ExportTable(
+        name="scrolled_jobs",
+        columns=[
+            ("entry_id", pa.int64()),
+            ("entry_date", pa.timestamp("s")),
+            ("job_title", pa.string()),
+            ("company", pa.string()),
+            ("location", LOW_CARDINALITY),
+            ("time_of_posting", LOW_CARDINALITY),
+            ("job_link", pa.string()),
+            ("job_id", pa.string()),
+            ("search_keyword", LOW_CARDINALITY),
+            ("search_location", LOW_CARDINALITY),
+        ],
+        key=["entry_id"],
+        start=[0],
+    ),
+    "jobs": ExportTable(
+        name="jobs",
+        columns=[
+            ("entry_date", pa.timestamp("s")),
+            ("job_id", pa.string()),
+            ("job_link", pa.string()),
+            ("job_description", pa.string()),
+            ("seniority_level", LOW_CARDINALITY),
+            ("employment_type", LOW_CARDINALITY),
+            ("job_function", LOW_CARDINALITY),
+            ("industries", LOW_CARDINALITY),
+        ],
+        key=["entry_date", "job_id"],
+        start=[datetime(1970, 1, 1), ""],
+    ),
+    # every search that found each job, including the known jobs found again by other searches,
+    # which are not written to scrolled_jobs once the sightings are ready
+    "job_sightings": ExportTable(
+        name="job_sightings",
+        columns=[
+            ("seen_at", pa.timestamp("s")),
+            ("job_id", pa.string()),
+            ("search_keyword", LOW_CARDINALITY),
+            ("search_location", LOW_CARDINALITY),
+        ],
+        key=["seen_at", "job_id", "search_keyword", "search_location"],
+        start=[datetime(1970, 1, 1), "", "", ""],
+        date_column="seen_at",
+        source="""(
+            SELECT j.seen_at, js.job_id, s.search_keyword, s.search_location FROM job_sightings j
+            JOIN jobs_seen js ON js.id = j.job_ref JOIN searches s ON s.id = j.search_ref
+        ) sightings""",
+        requires_sightings=True,
+    ),
+}
+
+
+def _to_datetime(value) -> datetime:
+    # MySQL returns datetimes, SQLite the text they were stored as
+    if value is None or isinstance(value, datetime):
+        return value
+    return datetime.fromisoformat(value)
+
+
+class ExportWatermarks:
+    def __init__(self, path: str):
+
+        # table -> key of the last exported row, kept in a small json file next to the exports
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.watermarks = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.watermarks = json.load(file)
+
+        os.makedirs(self.path.parent, exist_ok=True)
+
+
+    def get(self, table: ExportTable) -> list:
+        with self._lock:
+            value = self.watermarks.get(table.name)
+        if value is None:
+            return list(table.start)
+        return [_to_datetime(item) if name == table.date_column else item for name, item in zip(table.key, value)]
+
+
+    def set(self, table: ExportTable, value: list):
+        with self._lock:
+            self.watermarks[table.name] = [item.isoformat(sep=" ") if isinstance(item, datetime) else item for item in value]
+            tmp_file = self.path.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                json.dump(self.watermarks, file, indent=4)
+            os.replace(tmp_file, self.path)
+
+
+class _PartitionWriter:
+    def __init__(self, table: ExportTable, out_dir: Path, run_key: str, row_group_size: int):
+
+        # writes the rows of one day at a time, so that only a row group is held in memory,
+        # a file only gets its final name once it is complete
+        self.table = table
+        self.out_dir = out_dir
+        self.run_key = run_key
+        self.row_group_size = row_group_size
+        self.day = None
+        self.writer = None
+        self.path = None
+        self.buffer = []
+        self.files = []
+
+
+    def write(self, row: tuple, day):
+        if day != self.day:
+            self.close()
+            self.day = day
+        self.buffer.append(row)
+        if len(self.buffer) >= self.row_group_size:
+            self._flush()
+
+
+    def _flush(self):
+        if not self.buffer:
+            return
+        if self.writer is None:
+            # named after the watermark the run started from and the file's position in the run,
+            # so a run repeated after a crash overwrites its own files instead of duplicating the rows
+            partition = self.out_dir / self.table.name / f"entry_day={self.day.isoformat()}"
+            os.makedirs(partition, exist_ok=True)
+            self.path = partition / f"part-{self.run_key}-{len(self.files):05d}.parquet"
+            self.writer = pq.ParquetWriter(self.path.with_suffix(".tmp"), self.table.schema,
+                                           use_dictionary=self.table.dictionary_columns, compression="zstd")
+        columns = list(zip(*self.buffer))
+        arrays = [pa.array(values, type=data_type) for values, (_, data_type) in zip(columns, self.table.columns)]
+        self.writer.write_table(pa.Table.from_arrays(arrays, schema=self.table.schema))
+        self.buffer = []
+
+
+    def close(self):
+        self._flush()
+        if self.writer is not None:
+            self.writer.close()
+            os.replace(self.path.with_suffix(".tmp"), self.path)
+            self.files.append(self.path)
+            self.writer = None
+
+
+def _after_key(key: List[str]) -> str:
+    # keyset condition `key > watermark` for one or more columns, e.g. (a > %s) OR (a = %s AND b > %s)
+    clauses = []
+    for position in range(len(key)):
+        clauses.append("(" + " AND ".join([f"{name} = %s" for name in key[:position]] + [f"{key[position]} > %s"]) + ")")
+    return " OR ".join(clauses)
+
+
+def _after_params(watermark: list) -> list:
+    params = []
+    for position in range(len(watermark)):
+        params += watermark[:position + 1]
+    return params
+
+
+def export_table(db: DB,
+                 table_name: str,
+                 out_dir: str,
+                 watermarks: ExportWatermarks,
+                 row_group_size: int = 10000,
+                 lag_seconds: int = 60) -> Dict[str, int]:
+
+    # streams the rows added since the last export, in key order, into `<out_dir>/<table>/entry_day=<date>/` parquet files.
+    # Rows younger than `lag_seconds` wait for the next export, so that transactions still committing
+    # with an earlier key are not skipped by the watermark
+    table = EXPORT_TABLES[table_name]
+    names = [name for name, _ in table.columns]
+    watermark = watermarks.get(table)
+    cutoff = datetime.now() - timedelta(seconds=lag_seconds)
+
+    command = f"""
+    SELECT {', '.join(names)} FROM {table.from_clause}
+    WHERE ({_after_key(table.key)}) AND {table.date_column} < %s
+    ORDER BY {', '.join(table.key)}
+    """
+    run_key = "-".join([item.strftime("%Y%m%d%H%M%S") if isinstance(item, datetime) else str(item) for item in watermark])
+    run_key = "".join([char if char.isalnum() or char == "-" else "_" for char in run_key])[:80]
+    writer = _PartitionWriter(table, Path(out_dir), run_key, row_group_size)
+
+    date_position = names.index(table.date_column)
+    key_positions = [names.index(name) for name in table.key]
+    rows = 0
+    last_row = None
+    for row in db._stream(command, _after_params(watermark) + [cutoff], chunk_size=row_group_size):
+        row = list(row)
+        row[date_position] = _to_datetime(row[date_position])
+        writer.write(tuple(row), row[date_position].date())
+        last_row = row
+        rows += 1
+    writer.close()
+
+    # moved only once every file is in place, an interrupted export is redone from the same watermark
+    if last_row is not None:
+        watermarks.set(table, [last_row[position] for position in key_positions])
+    return {"rows": rows, "files": len(writer.files)}
+
+
+def export_all(db: DB, out_dir: str, tables: List[str] = None, **kwargs) -> Dict[str, Dict[str, int]]:
+    # the sightings wait for their backfill, as the watermark would move past the older sightings it adds
+    if tables is None:
+        tables = [name for name, table in EXPORT_TABLES.items() if db.sightings_ready or not table.requires_sightings]
+    for name in tables:
+        if EXPORT_TABLES[name].requires_sightings and not db.sightings_ready:
+            raise ValueError(f"{name} can only be exported once the sightings are backfilled, run migrate_schema.py first")
+    watermarks = ExportWatermarks(Path(out_dir) / "export_watermarks.json")
+    return {table: export_table(db, table, out_dir, watermarks, **kwargs) for table in tables}
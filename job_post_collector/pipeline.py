@@ -0,0 +1,59 @@
+import queue
+import threading
+from typing import List
+
+from job_post_collector.db import ScrolledJob
+from job_post_collector.jd_getter import JD_Getter
+from job_post_collector.metrics import METRICS
+
+
+class ScrollToJDPipeline:
+    def __init__(self, 
+                 jd_getter: JD_Getter,
+                 buffer_size: int = 200):
+        
+        # jobs stored by the scrollers flow through a bounded channel to a JD fetcher thread,
+        # a full channel blocks the scrollers until the fetcher catches up
+        self.jd_getter = jd_getter
+        self.channel = queue.Queue(maxsize=buffer_size)
+        self.collected = 0
+        self.failed = 0
+        self._sentinel = object()
+        self._thread = threading.Thread(target=self._consume, daemon=True)
+        METRICS.register_gauge("queue_depth", self.channel.qsize, queue="pipeline")
+        
+        
+    def sink(self, jobs: List[dict]):
+        for job in jobs:
+            if self.channel.full():
+                with METRICS.timer("sleep_seconds", collector="scroller", reason="backpressure"):
+                    self.channel.put(ScrolledJob(job["job_id"], job["job_link"]))
+            else:
+                self.channel.put(ScrolledJob(job["job_id"], job["job_link"]))
+            
+            
+    def start(self):
+        self._thread.start()
+        
+        
+    def _consume(self):
+        while True:
+            job = self.channel.get()
+            if job is self._sentinel:
+                break
+            # paced by the JD getter, independently of the scrollers
+            if self.jd_getter.collect_job(job.job_id, job.job_link):
+                self.collected += 1
+            else:
+                self.failed += 1
+                
+                
+    def stop(self):
+        # the jobs still buffered are collected before returning
+        self.channel.put(self._sentinel)
+        self._thread.join()
+        
+        
+    @property
+    def backlog(self) -> int:
+        return self.channel.qsize()
@@ -0,0 +1,36 @@
+import threading
+import time
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float = 1):
+        
+        self.rate = rate  # tokens added per second
+        self.capacity = capacity  # maximum burst size
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        
+        
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+        
+        
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill()
+            self.rate = rate
+            
+            
+    def acquire(self, tokens: float = 1):
+        # blocks until the tokens are available, shared by all the threads using the bucket
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
@@ -0,0 +1,183 @@
+import json
+import math
+import os
+import threading
+import logging
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+
+@dataclass
+class ScheduledSearch:
+
+    search_term: str
+    location: str
+    interval_hours: float = 24 # Time between two runs of the search
+    max_window_days: float = 30 # Window used on the first run, and the widest one ever requested
+    max_jobs: int = 400 # Passed on to the `SearchConfig` of each run
+
+    @property
+    def key(self) -> str:
+        return f"{self.search_term}_{self.location}"
+
+    @property
+    def search_keyword(self) -> str:
+        # as stored in the search_keyword columns by the scrollers
+        return self.search_term.replace(" ", "+")
+
+
+def compute_window_seconds(watermark: datetime,
+                           now: datetime,
+                           max_window_seconds: int,
+                           overlap_seconds: int = 3600,
+                           granularity_seconds: int = 3600) -> int:
+    # the narrowest `f_TPR` window reaching back to the last run that went through all of its results,
+    # with some overlap for late indexed posts, rounded up to whole hours
+    if watermark is None:
+        return max_window_seconds
+    gap = (now - watermark).total_seconds() + overlap_seconds
+    window = math.ceil(gap / granularity_seconds) * granularity_seconds
+    return int(min(max(window, granularity_seconds), max_window_seconds))
+
+
+class WatermarkStore:
+    def __init__(self, path: str):
+
+        # search key -> start time of its last run that went through all of its results, kept in a small json file
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.watermarks = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.watermarks = json.load(file)
+
+        os.makedirs(self.path.parent, exist_ok=True)
+
+
+    def get(self, key: str) -> datetime:
+        with self._lock:
+            value = self.watermarks.get(key)
+        return datetime.fromisoformat(value) if value else None
+
+
+    def set(self, key: str, value: datetime):
+        with self._lock:
+            self.watermarks[key] = value.isoformat(timespec="seconds")
+            tmp_file = self.path.with_suffix(".tmp")
+            with open(tmp_file, "w", encoding="utf-8") as file:
+                json.dump(self.watermarks, file, indent=4)
+            os.replace(tmp_file, self.path)
+
+
+class SearchScheduler:
+    def __init__(self,
+                 searches: List[ScheduledSearch],
+                 run_search: Callable[[ScheduledSearch, int], str],
+                 watermarks: WatermarkStore,
+                 last_seen: Callable[[ScheduledSearch], Optional[datetime]] = None,
+                 max_concurrent: int = 2,
+                 overlap_minutes: float = 60,
+                 retry_minutes: float = 30,
+                 poll_seconds: float = 30):
+
+        # `run_search(search, window_seconds)` runs one search and returns its outcome (see `JobScroller.outcome`):
+        # "reached_end" moves its watermark to the start of the run. "cut_short" (max_jobs, stale batches) keeps the watermark,
+        # as the results are sorted by relevance and the postings it didn't reach are only asked for again by a window
+        # still covering them. "failed" is retried after `retry_minutes`. The runs are expected to go on through the jobs
+        # already known (no early stop on stale batches), otherwise most of them stop short of the end of their window.
+        # `last_seen(search)` gives the searches without a watermark a first one, from the latest job found by the earlier
+        # (unscheduled) runs of the same search, so that the scheduler doesn't start every search with its widest window
+        self.searches = searches
+        self.run_search = run_search
+        self.watermarks = watermarks
+        self.max_concurrent = max_concurrent
+        self.overlap_seconds = int(overlap_minutes * 60)
+        self.retry_minutes = retry_minutes
+        self.poll_seconds = poll_seconds
+
+        self.stop_event = threading.Event()
+        self.running: Dict[str, threading.Thread] = {}
+        # window of the last failed run of each search, reused by its retry while it still reaches back far enough,
+        # so that the retry has the same card log key and resumes from it
+        self.retry_windows: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.logger = logging.getLogger("search_scheduler")
+
+        # searches are due right away unless their last successful run is recent enough
+        self.next_run = {}
+        for search in searches:
+            watermark = watermarks.get(search.key)
+            if watermark is None and last_seen is not None:
+                watermark = last_seen(search)
+                if watermark is not None:
+                    self.logger.info(f"Search {search.key} starts from its latest sighting, at {watermark:%Y-%m-%d %H:%M}")
+                    watermarks.set(search.key, watermark)
+            self.next_run[search.key] = watermark + timedelta(hours=search.interval_hours) if watermark else datetime.now()
+
+
+    def window_for(self, search: ScheduledSearch, now: datetime) -> int:
+        window = compute_window_seconds(self.watermarks.get(search.key), now,
+                                        max_window_seconds=int(search.max_window_days * 86400),
+                                        overlap_seconds=self.overlap_seconds)
+        retry_window = self.retry_windows.pop(search.key, None)
+        return retry_window if retry_window is not None and retry_window >= window else window
+
+
+    def _run(self, search: ScheduledSearch, started_at: datetime, window: int):
+        outcome = "failed"
+        try:
+            outcome = self.run_search(search, window)
+        except Exception as e:
+            self.logger.error(f"Search {search.key} failed: {e}")
+        finally:
+            with self._lock:
+                if outcome == "reached_end":
+                    self.watermarks.set(search.key, started_at)
+                if outcome == "failed":
+                    # the watermark stays put, so the next run still covers the whole gap
+                    self.retry_windows[search.key] = window
+                    self.next_run[search.key] = datetime.now() + timedelta(minutes=min(self.retry_minutes, search.interval_hours * 60))
+                else:
+                    self.next_run[search.key] = started_at + timedelta(hours=search.interval_hours)
+                self.running.pop(search.key, None)
+            self.logger.info(f"Search {search.key} {outcome.replace('_', ' ')}, next run at {self.next_run[search.key]:%Y-%m-%d %H:%M}")
+
+
+    def start_due_searches(self) -> int:
+        now = datetime.now()
+        started = 0
+        with self._lock:
+            # the most overdue searches go first while the concurrency limit is reached
+            for search in sorted(self.searches, key=lambda search: self.next_run[search.key]):
+                if len(self.running) >= self.max_concurrent:
+                    break
+                if search.key in self.running or self.next_run[search.key] > now:
+                    continue
+                window = self.window_for(search, now)
+                self.logger.info(f"Starting search {search.key} with a window of {window / 3600:.0f} hours")
+                thread = threading.Thread(target=self._run, args=(search, now, window), daemon=True)
+                self.running[search.key] = thread
+                thread.start()
+                started += 1
+        return started
+
+
+    def run_forever(self):
+        self.logger.info(f"Scheduling {len(self.searches)} searches, at most {self.max_concurrent} at a time")
+        try:
+            while not self.stop_event.is_set():
+                self.start_due_searches()
+                self.stop_event.wait(self.poll_seconds)
+        finally:
+            self.stop()
+
+
+    def stop(self):
+        # lets the running searches finish, the due ones are picked up on the next start
+        self.stop_event.set()
+        with self._lock:
+            threads = list(self.running.values())
+        for thread in threads:
+            thread.join()
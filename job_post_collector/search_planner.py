@@ -0,0 +1,144 @@
+import math
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+
+
+@dataclass
+class PlannedSearch:
+
+    keyword: str
+    location: str
+    seen: int # jobs found by the search in the history
+    unique: int # jobs no other search found
+    marginal: int # jobs not found by the searches planned before it
+    keep: bool = True
+    budget_fraction: float = 1.0 # share of `max_jobs` the search is given
+
+    @property
+    def marginal_fraction(self) -> float:
+        return self.marginal / self.seen if self.seen else 0.0
+
+    def max_jobs(self, full_budget: int) -> int:
+        return max(1, math.ceil(full_budget * self.budget_fraction))
+
+
+class SearchPlanner:
+    def __init__(self,
+                 min_marginal_fraction: float = 0.05,
+                 full_budget_fraction: float = 0.5,
+                 min_budget_fraction: float = 0.25,
+                 seconds_per_card: float = 2.0):
+
+        # searches adding less than `min_marginal_fraction` new jobs per card scrolled are pruned,
+        # the ones adding less than `full_budget_fraction` get a proportionally smaller `max_jobs`
+        self.min_marginal_fraction = min_marginal_fraction
+        self.full_budget_fraction = full_budget_fraction
+        self.min_budget_fraction = min_budget_fraction
+        self.seconds_per_card = seconds_per_card # browser time per scrolled card, to report the savings in minutes
+
+        # (search_keyword, search_location) -> compact ids of the jobs it found
+        self.terms: Dict[Tuple[str, str], set] = {}
+        self._job_ids: Dict[str, int] = {}
+
+
+    def load_history(self, sightings: Iterable[Tuple[str, str, str]]):
+        for job_id, keyword, location in sightings:
+            compact_id = self._job_ids.setdefault(job_id, len(self._job_ids))
+            self.terms.setdefault((keyword, location), set()).add(compact_id)
+
+
+    def shared_fraction(self) -> float:
+        # share of the jobs found by more than one search. Close to 0 across many searches means the history only
+        # holds the first search finding each job (as stored before the known jobs' sightings were recorded),
+        # the overlap and the unique yields computed from it would be meaningless
+        finders = {}
+        for jobs in self.terms.values():
+            for job in jobs:
+                finders[job] = finders.get(job, 0) + 1
+        return sum([1 for count in finders.values() if count > 1]) / len(finders) if finders else 0.0
+
+
+    def term_stats(self) -> pd.DataFrame:
+        finders = {}
+        for jobs in self.terms.values():
+            for job in jobs:
+                finders[job] = finders.get(job, 0) + 1
+
+        rows = []
+        for (keyword, location), jobs in self.terms.items():
+            unique = sum([1 for job in jobs if finders[job] == 1])
+            rows.append((keyword, location, len(jobs), unique, unique / len(jobs)))
+        return pd.DataFrame(rows, columns=["keyword", "location", "seen", "unique", "unique_fraction"]) \
+            .sort_values("unique_fraction", ascending=False, ignore_index=True)
+
+
+    def pairwise_overlap(self) -> pd.DataFrame:
+        # share of the jobs of the row search that the column search also found
+        keys = list(self.terms)
+        labels = [f"{keyword} ({location})" for keyword, location in keys]
+        matrix = [[len(self.terms[a] & self.terms[b]) / len(self.terms[a]) for b in keys] for a in keys]
+        return pd.DataFrame(matrix, index=labels, columns=labels)
+
+
+    def plan(self) -> List[PlannedSearch]:
+        stats = self.term_stats().set_index(["keyword", "location"])
+
+        # greedy weighted set cover: the search bringing the most new jobs per card scrolled goes next,
+        # so that the overlapping searches after it mostly see known jobs and stop early
+        covered = set()
+        remaining = dict(self.terms)
+        planned = []
+        while remaining:
+            key, jobs = max(remaining.items(), key=lambda item: (len(item[1] - covered) / len(item[1]), len(item[1])))
+            marginal = len(jobs - covered)
+            covered |= jobs
+            del remaining[key]
+
+            search = PlannedSearch(keyword=key[0], location=key[1], seen=len(jobs),
+                                   unique=int(stats.loc[key, "unique"]), marginal=marginal)
+            if search.marginal_fraction < self.min_marginal_fraction:
+                search.keep = False
+                search.budget_fraction = 0.0
+            elif search.marginal_fraction < self.full_budget_fraction:
+                search.budget_fraction = max(self.min_budget_fraction, search.marginal_fraction / self.full_budget_fraction)
+            planned.append(search)
+        return planned
+
+
+    def savings(self, plan: List[PlannedSearch]) -> dict:
+        # expects the cards scrolled by a search to shrink with its budget, and its new jobs with them
+        cards_before = sum([search.seen for search in plan])
+        jobs_before = sum([search.marginal for search in plan])
+        cards_after = sum([search.seen * search.budget_fraction for search in plan])
+        jobs_after = sum([search.marginal * search.budget_fraction for search in plan])
+        return {
+            "searches_before": len(plan),
+            "searches_after": sum([search.keep for search in plan]),
+            "cards_before": cards_before,
+            "cards_after": round(cards_after),
+            "cards_saved_pct": 100 * (1 - cards_after / cards_before) if cards_before else 0.0,
+            "new_jobs_before": jobs_before,
+            "new_jobs_after": round(jobs_after),
+            "new_jobs_lost_pct": 100 * (1 - jobs_after / jobs_before) if jobs_before else 0.0,
+            "new_jobs_per_browser_minute_before": jobs_before / (cards_before * self.seconds_per_card / 60) if cards_before else 0.0,
+            "new_jobs_per_browser_minute_after": jobs_after / (cards_after * self.seconds_per_card / 60) if cards_after else 0.0,
+            "browser_minutes_saved": (cards_before - cards_after) * self.seconds_per_card / 60,
+        }
+
+
+    def to_search_config(self, plan: List[PlannedSearch], last_how_many_days: int, max_jobs: int) -> dict:
+        # same format as the files in `search_configs`, in the planned order, with a `max_jobs` per search
+        return {
+            "description": "Searches ordered and pruned by their historical yield of new jobs.",
+            "searches": [
+                {
+                    "search_term": search.keyword.replace("+", " "),
+                    "location": search.location,
+                    "last_how_many_days": last_how_many_days,
+                    "max_jobs": search.max_jobs(max_jobs)
+                }
+                for search in plan if search.keep
+            ]
+        }
@@ -0,0 +1,542 @@
+import os
+import re
+import sqlite3
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Iterator, List, Tuple, Union
+
+from job_post_collector.db import DB, DB_Creds, QueuedJob, JD_QUEUE_STATES
+from job_post_collector.job_search import QueryClause, to_fts5
+from job_post_collector.metrics import METRICS
+
+
+@dataclass
+class SQLite_Creds:
+
+    path: str = "./mount/jobs_data.sqlite3"
+
+
+# the timestamps are stored as local time text, as the MySQL server does for the same columns
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(sep=" ", timespec="seconds"))
+LOCAL_NOW = "datetime('now', 'localtime')"
+
+
+class _SQLiteCursor:
+    def __init__(self, cursor: sqlite3.Cursor):
+
+        # takes the `%s` placeholders of the MySQL statements shared with `DB`
+        self.cursor = cursor
+
+
+    def execute(self, command: str, params=()):
+        self.cursor.execute(command.replace("%s", "?"), tuple(params))
+
+
+    def executemany(self, command: str, rows):
+        self.cursor.executemany(command.replace("%s", "?"), rows)
+
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+
+    def fetchmany(self, size: int):
+        return self.cursor.fetchmany(size)
+
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+    @property
+    def rowcount(self) -> int:
+        return self.cursor.rowcount
+
+
+    def close(self):
+        self.cursor.close()
+
+
+class _SQLiteConnection:
+    def __init__(self, path: str, timeout: float = 30):
+
+        # shared by the threads of a collector the same way as the MySQL connection (one writer at a time),
+        # the WAL journal lets the streaming readers run on their own connections next to the writes
+        self.connection = sqlite3.connect(path, timeout=timeout, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+
+
+    def cursor(self, buffered: bool = None) -> _SQLiteCursor:
+        return _SQLiteCursor(self.connection.cursor())
+
+
+    def commit(self):
+        self.connection.commit()
+
+
+    def rollback(self):
+        self.connection.rollback()
+
+
+    def close(self):
+        self.connection.close()
+
+
+    disconnect = close
+
+
+class SQLiteDB(DB):
+    # conflict targets of the upserts, the primary or unique key of each table
+    UNIQUE_KEYS = {
+        "jobs": ["job_id"],
+        "scrolled_jobs": ["job_id", "search_keyword", "search_location"],
+        "jd_queue": ["job_id"],
+        "jobs_seen": ["job_id"],
+        "searches": ["search_keyword", "search_location"],
+        "job_sightings": ["job_ref", "search_ref"],
+    }
+    INSERT_IGNORE = "INSERT OR IGNORE"
+
+    def __init__(self, creds: SQLite_Creds, chunk_size: int = 1000):
+
+        # the same tables and methods as `DB` in a single local file, without a database server
+        os.makedirs(Path(creds.path).parent, exist_ok=True)
+        super().__init__(creds, chunk_size)
+
+
+    def _connect(self):
+        return _SQLiteConnection(self.creds.path)
+
+
+    def _create_jobs_table(self):
+
+        cursor = self.db.cursor()
+        cursor.execute(self._jobs_table_command("jobs"))
+        self.db.commit()
+        cursor.close()
+
+
+    def _jobs_table_command(self, table: str) -> str:
+
+        # `id` aliases the rowid, which keeps it through a VACUUM (the implicit rowid of a table keyed on text does not),
+        # so that the full-text index can point at it
+        return f"""
+        CREATE TABLE IF NOT EXISTS {table}(
+            id INTEGER PRIMARY KEY,
+            entry_date TIMESTAMP DEFAULT ({LOCAL_NOW}),
+            job_id VARCHAR(255) NOT NULL UNIQUE,
+            job_link VARCHAR(2555),
+            job_description TEXT,
+            seniority_level VARCHAR(255),
+            employment_type VARCHAR(255),
+            job_function VARCHAR(255),
+            industries VARCHAR(255)
+            )
+            """
+
+
+    def _table_columns(self, table: str) -> List[str]:
+
+        cursor = self.db.cursor()
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = [row[1] for row in cursor.fetchall()]
+        cursor.close()
+        return columns
+
+
+    def _create_scrolled_jobs_table(self):
+
+        cursor = self.db.cursor()
+        command = f"""
+        CREATE TABLE IF NOT EXISTS scrolled_jobs(
+            entry_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            entry_date TIMESTAMP DEFAULT ({LOCAL_NOW}),
+            job_title VARCHAR(255),
+            company VARCHAR(255),
+            location VARCHAR(255),
+            time_of_posting VARCHAR(255),
+            job_link VARCHAR(2555),
+            job_id VARCHAR(255),
+            search_keyword VARCHAR(255),
+            search_location VARCHAR(255),
+            UNIQUE (job_id, search_keyword, search_location)
+            )
+            """
+        cursor.execute(command)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_scrolled_job_id ON scrolled_jobs (job_id)")
+        self.db.commit()
+        cursor.close()
+
+
+    def _create_jd_queue_table(self):
+
+        cursor = self.db.cursor()
+        command = f"""
+        CREATE TABLE IF NOT EXISTS jd_queue(
+            job_id VARCHAR(255) PRIMARY KEY,
+            job_link VARCHAR(2555),
+            state VARCHAR(32) NOT NULL DEFAULT 'pending' CHECK (state IN ({', '.join([f"'{state}'" for state in JD_QUEUE_STATES])})),
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME NOT NULL DEFAULT ({LOCAL_NOW}),
+            lease_owner VARCHAR(255),
+            lease_expires_at DATETIME,
+            last_error TEXT,
+            updated_at DATETIME DEFAULT ({LOCAL_NOW})
+            )
+            """
+        cursor.execute(command)
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jd_queue_claim ON jd_queue (state, next_attempt_at)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jd_queue_lease ON jd_queue (state, lease_expires_at)")
+        # stands in for MySQL's ON UPDATE CURRENT_TIMESTAMP
+        cursor.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS jd_queue_updated_at AFTER UPDATE ON jd_queue
+        BEGIN
+            UPDATE jd_queue SET updated_at = {LOCAL_NOW} WHERE job_id = NEW.job_id;
+        END
+        """)
+        self.db.commit()
+        cursor.close()
+
+
+    def _create_sightings_tables(self):
+
+        cursor = self.db.cursor()
+        commands = [f"""
+        CREATE TABLE IF NOT EXISTS jobs_seen(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            job_id VARCHAR(255) NOT NULL UNIQUE,
+            job_link VARCHAR(2555),
+            first_seen_at TIMESTAMP DEFAULT ({LOCAL_NOW})
+            )
+            ""","""
+        CREATE TABLE IF NOT EXISTS searches(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            search_keyword VARCHAR(255) NOT NULL,
+            search_location VARCHAR(255) NOT NULL,
+            UNIQUE (search_keyword, search_location)
+            )
+            """,f"""
+        CREATE TABLE IF NOT EXISTS job_sightings(
+            job_ref INTEGER NOT NULL,
+            search_ref INTEGER NOT NULL,
+            seen_at TIMESTAMP DEFAULT ({LOCAL_NOW}),
+            PRIMARY KEY (job_ref, search_ref)
+            ) WITHOUT ROWID
+            """,
+            "CREATE INDEX IF NOT EXISTS idx_job_sightings_search ON job_sightings (search_ref, seen_at)"]
+        for command in commands:
+            cursor.execute(command)
+        self.db.commit()
+        cursor.close()
+
+
+    def _index_exists(self, table: str, index_name: str) -> bool:
+
+        cursor = self.db.cursor()
+        cursor.execute(f"PRAGMA index_list({table})")
+        exists = index_name in [row[1] for row in cursor.fetchall()]
+        cursor.close()
+        return exists
+
+
+    def _delete_duplicate_scrolled_jobs_batch(self, cursor, lower_entry_id: int, upper_entry_id: int):
+
+        command = """
+        DELETE FROM scrolled_jobs
+        WHERE entry_id > %s AND entry_id <= %s AND EXISTS (
+            SELECT 1 FROM scrolled_jobs k WHERE k.job_id = scrolled_jobs.job_id AND k.search_keyword = scrolled_jobs.search_keyword
+                AND k.search_location = scrolled_jobs.search_location AND k.entry_id < scrolled_jobs.entry_id
+            )
+        """
+        cursor.execute(command, (lower_entry_id, upper_entry_id))
+
+
+    def _add_index(self, table: str, index_name: str, definition: str):
+        # the same MySQL definitions, e.g. "UNIQUE KEY uq_name (a, b)", as CREATE INDEX statements
+        unique, columns = re.match(r"(UNIQUE )?(?:KEY|INDEX) \w+ \((.+)\)", definition).groups()
+        cursor = self.db.cursor()
+        # skipped when the table definition already has an index on the same columns
+        cursor.execute(f"PRAGMA index_list({table})")
+        for existing in [row[1] for row in cursor.fetchall()]:
+            cursor.execute(f"PRAGMA index_info({existing})")
+            if [row[2] for row in cursor.fetchall()] == [column.strip() for column in columns.split(",")]:
+                cursor.close()
+                return
+        cursor.execute(f"CREATE {unique or ''}INDEX IF NOT EXISTS {index_name} ON {table} ({columns})")
+        self.db.commit()
+        cursor.close()
+
+
+    def _backfill_sightings_batch(self, cursor, lower_entry_id: int, upper_entry_id: int):
+
+        params = (lower_entry_id, upper_entry_id)
+        cursor.execute("""
+        INSERT OR IGNORE INTO searches (search_keyword, search_location)
+        SELECT DISTINCT search_keyword, search_location FROM scrolled_jobs WHERE entry_id > %s AND entry_id <= %s
+        """, params)
+        # WHERE true lets the parser tell the upsert clause from a join constraint
+        cursor.execute("""
+        INSERT INTO jobs_seen (job_id, job_link, first_seen_at)
+        SELECT job_id, job_link, entry_date FROM scrolled_jobs WHERE entry_id > %s AND entry_id <= %s AND true ORDER BY entry_id
+        ON CONFLICT (job_id) DO UPDATE SET first_seen_at = MIN(first_seen_at, excluded.first_seen_at)
+        """, params)
+        cursor.execute("""
+        INSERT OR IGNORE INTO job_sightings (job_ref, search_ref, seen_at)
+        SELECT js.id, s.id, sj.entry_date FROM scrolled_jobs sj
+        JOIN jobs_seen js ON js.job_id = sj.job_id
+        JOIN searches s ON s.search_keyword = sj.search_keyword AND s.search_location = sj.search_location
+        WHERE sj.entry_id > %s AND sj.entry_id <= %s
+        """, params)
+
+
+    def _bulk_insert(self, table: str, entries: List[dict], on_duplicate: str = "ignore", batch_size: int = 500, commit: bool = True) -> int:
+
+        if not entries:
+            return 0
+
+        entry_tags = list(entries[0].keys())
+        if on_duplicate == "ignore":
+            prefix, suffix = "INSERT OR IGNORE", ""
+        elif on_duplicate == "update":
+            keys = self.UNIQUE_KEYS[table]
+            prefix = "INSERT"
+            suffix = f" ON CONFLICT ({', '.join(keys)}) DO UPDATE SET " + \
+                ", ".join([f"{tag}=excluded.{tag}" for tag in entry_tags if tag not in keys])
+        else:
+            raise ValueError(f"Unknown on_duplicate mode: {on_duplicate}")
+
+        # one prepared statement run for every row of a batch inside a single transaction,
+        # the fastest way to load rows into SQLite (ignored duplicates count 0, updated rows count 1)
+        command = f"""{prefix} INTO {table} ({', '.join(entry_tags)}) VALUES ({', '.join(['%s' for _ in entry_tags])}){suffix}"""
+        inserted = 0
+        cursor = self.db.cursor()
+        for start in range(0, len(entries), batch_size):
+            batch = entries[start:start + batch_size]
+            with METRICS.timer("db_write_seconds", table=table):
+                cursor.executemany(command, [[entry[tag] for tag in entry_tags] for entry in batch])
+                if commit:
+                    self.db.commit()
+            METRICS.inc("db_rows_written_total", len(batch), table=table)
+            inserted += cursor.rowcount
+        cursor.close()
+        return inserted
+
+
+    def _migrate_fulltext_index(self, version: int, batch_size: int = None, pause: float = None):
+
+        # an FTS5 index reading the descriptions from jobs through its `id`, kept up to date by triggers on every
+        # insert_job, the rebuild indexes the rows already there. All in one transaction, as the jobs table may be rebuilt
+        cursor = self.db.cursor()
+        cursor.execute("BEGIN")
+        for trigger in ["jobs_fts_insert", "jobs_fts_delete", "jobs_fts_update"]:
+            cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cursor.execute("DROP TABLE IF EXISTS jobs_fts")
+        self._add_jobs_id(cursor)
+        cursor.execute("CREATE VIRTUAL TABLE jobs_fts USING fts5(job_description, content='jobs', content_rowid='id')")
+        cursor.execute("""
+        CREATE TRIGGER jobs_fts_insert AFTER INSERT ON jobs
+        BEGIN
+            INSERT INTO jobs_fts (rowid, job_description) VALUES (NEW.id, NEW.job_description);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER jobs_fts_delete AFTER DELETE ON jobs
+        BEGIN
+            INSERT INTO jobs_fts (jobs_fts, rowid, job_description) VALUES ('delete', OLD.id, OLD.job_description);
+        END
+        """)
+        cursor.execute("""
+        CREATE TRIGGER jobs_fts_update AFTER UPDATE OF job_description ON jobs
+        BEGIN
+            INSERT INTO jobs_fts (jobs_fts, rowid, job_description) VALUES ('delete', OLD.id, OLD.job_description);
+            INSERT INTO jobs_fts (rowid, job_description) VALUES (NEW.id, NEW.job_description);
+        END
+        """)
+        cursor.execute("INSERT INTO jobs_fts (jobs_fts) VALUES ('rebuild')")
+        self.db.commit()
+        cursor.close()
+
+
+    def _add_jobs_id(self, cursor):
+
+        # files created before the `id` column get their jobs copied into a new table, in their current rowid order,
+        # as SQLite cannot add an INTEGER PRIMARY KEY to an existing one
+        columns = self._table_columns("jobs")
+        if "id" in columns:
+            return
+        cursor.execute(self._jobs_table_command("jobs_keyed"))
+        cursor.execute(f"INSERT INTO jobs_keyed ({', '.join(columns)}) SELECT {', '.join(columns)} FROM jobs ORDER BY rowid")
+        cursor.execute("DROP TABLE jobs")
+        cursor.execute("ALTER TABLE jobs_keyed RENAME TO jobs")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_jobs_entry_date ON jobs (entry_date)")
+
+
+    def _migrate_fulltext_key(self, version: int, batch_size: int = None, pause: float = None):
+
+        # the files indexed before the `id` column point the index at the implicit rowid, which a VACUUM may renumber
+        if "id" not in self._table_columns("jobs"):
+            self._migrate_fulltext_index(version, batch_size=batch_size, pause=pause)
+
+
+    def _fulltext_match(self, clauses: List[QueryClause]) -> Tuple[str, str, str, list, list]:
+        # bm25 is lower for the better matches
+        return "jobs_fts JOIN jobs j ON j.id = jobs_fts.rowid", "jobs_fts MATCH %s", "-bm25(jobs_fts)", [], [to_fts5(clauses)]
+
+
+    def reclaim_expired_leases(self, max_attempts: int) -> int:
+
+        cursor = self.db.cursor()
+        command = f"""
+        UPDATE jd_queue SET state = CASE WHEN attempts >= %s THEN 'failed_permanent' ELSE 'failed_retryable' END,
+            lease_owner = NULL, lease_expires_at = NULL, last_error = 'lease expired'
+        WHERE state = 'leased' AND lease_expires_at < {LOCAL_NOW}
+        """
+        cursor.execute(command, (max_attempts,))
+        self.db.commit()
+        reclaimed = cursor.rowcount
+        cursor.close()
+        return reclaimed
+
+
+    def claim_jd_jobs(self, owner: str, batch_size: int, lease_seconds: int, max_attempts: int) -> List[QueuedJob]:
+
+        self.reclaim_expired_leases(max_attempts)
+
+        # SQLite has no row locks, the write lock taken upfront keeps other workers out until the jobs are leased
+        cursor = self.db.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            command = f"""
+            SELECT job_id, job_link, attempts FROM jd_queue
+            WHERE state IN ('pending', 'failed_retryable') AND next_attempt_at <= {LOCAL_NOW}
+            ORDER BY next_attempt_at
+            LIMIT %s
+            """
+            cursor.execute(command, (batch_size,))
+            rows = cursor.fetchall()
+            if rows:
+                command = f"""
+                UPDATE jd_queue SET state = 'leased', lease_owner = %s, lease_expires_at = datetime('now', 'localtime', %s), attempts = attempts + 1
+                WHERE job_id IN ({', '.join(['%s' for _ in range(len(rows))])})
+                """
+                cursor.execute(command, [owner, f"+{lease_seconds} seconds"] + [job_id for job_id, _, _ in rows])
+            self.db.commit()
+        except sqlite3.Error:
+            self.db.rollback()
+            raise
+        finally:
+            cursor.close()
+        return [QueuedJob(job_id, job_link, attempts + 1) for job_id, job_link, attempts in rows]
+
+
+    def renew_jd_leases(self, owner: str, job_ids: List[str], lease_seconds: int) -> int:
+
+        if not job_ids:
+            return 0
+        cursor = self.db.cursor()
+        command = f"""
+        UPDATE jd_queue SET lease_expires_at = datetime('now', 'localtime', %s)
+        WHERE state = 'leased' AND lease_owner = %s AND job_id IN ({', '.join(['%s' for _ in range(len(job_ids))])})
+        """
+        cursor.execute(command, [f"+{lease_seconds} seconds", owner] + list(job_ids))
+        self.db.commit()
+        renewed = cursor.rowcount
+        cursor.close()
+        return renewed
+
+
+    def fail_jd_job(self, job_id: str, owner: str, error: str, permanent: bool = False, retry_after: int = 0):
+
+        cursor = self.db.cursor()
+        command = """
+        UPDATE jd_queue SET state = %s, lease_owner = NULL, lease_expires_at = NULL, last_error = %s,
+            next_attempt_at = datetime('now', 'localtime', %s)
+        WHERE job_id = %s AND lease_owner = %s
+        """
+        cursor.execute(command, ("failed_permanent" if permanent else "failed_retryable", error, f"+{int(retry_after)} seconds", job_id, owner))
+        self.db.commit()
+        cursor.close()
+
+
+def open_db(creds: Union[DB_Creds, SQLite_Creds], chunk_size: int = 1000) -> DB:
+    # the MySQL server for `DB_Creds`, a local SQLite file for `SQLite_Creds`
+    if isinstance(creds, SQLite_Creds):
+        return SQLiteDB(creds, chunk_size)
+    return DB(creds, chunk_size)
+
+
+# columns copied by `migrate`, the auto-increment ids are left to the target. The sightings tables come first, so that
+# the scrolled jobs replayed into them afterwards keep the original dates, and they also hold the sightings of known jobs
+# that were never written to scrolled_jobs
+MIGRATED_COLUMNS = {
+    "searches": ["search_keyword", "search_location"],
+    "jobs_seen": ["job_id", "job_link", "first_seen_at"],
+    "job_sightings": ["job_id", "search_keyword", "search_location", "seen_at"],
+    "scrolled_jobs": ["entry_date", "job_title", "company", "location", "time_of_posting", "job_link", "job_id", "search_keyword", "search_location"],
+    "jobs": ["entry_date", "job_id", "job_link", "job_description", "seniority_level", "employment_type", "job_function", "industries"],
+    "jd_queue": ["job_id", "job_link", "state", "attempts", "next_attempt_at", "lease_owner", "lease_expires_at", "last_error"],
+}
+SIGHTINGS_TABLES = ["searches", "jobs_seen", "job_sightings"]
+
+
+def iter_table(db: DB, table: str, columns: List[str], chunk_size: int = None) -> Iterator[dict]:
+    if table == "job_sightings":
+        # by the natural keys, the ids of the source mean nothing in the target
+        command = """
+        SELECT js.job_id, s.search_keyword, s.search_location, j.seen_at FROM job_sightings j
+        JOIN jobs_seen js ON js.id = j.job_ref JOIN searches s ON s.id = j.search_ref
+        """
+    else:
+        command = f"SELECT {', '.join(columns)} FROM {table}"
+    for row in db._stream(command, chunk_size=chunk_size):
+        yield dict(zip(columns, row))
+
+
+def _copy_batch(target: DB, table: str, batch: List[dict]):
+    if table == "scrolled_jobs":
+        # keeps jobs_seen and job_sightings in step
+        target.insert_scrolled_jobs(batch)
+    elif table == "job_sightings":
+        target.insert_sightings(batch)
+    else:
+        target._bulk_insert(table, batch, on_duplicate="ignore")
+
+
+def migrate(source: DB, target: DB, batch_size: int = 5000) -> dict:
+    # streams every table from the source and bulk loads it into the target, rows already there are kept,
+    # so an interrupted migration can simply be run again
+    copied = {}
+    for table, columns in MIGRATED_COLUMNS.items():
+        if table in SIGHTINGS_TABLES and min(source.schema_version, target.schema_version) < 2:
+            continue
+        copied[table] = 0
+        batch = []
+        for row in iter_table(source, table, columns, chunk_size=batch_size):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                _copy_batch(target, table, batch)
+                copied[table] += len(batch)
+                batch = []
+        _copy_batch(target, table, batch)
+        copied[table] += len(batch)
+    return copied
+
+
+def _count_rows(db: DB, table: str) -> int:
+    cursor = db.db.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table}")
+    (count,) = cursor.fetchone()
+    cursor.close()
+    return count
+
+
+def compare_row_counts(source: DB, target: DB) -> dict:
+    # table -> (source rows, target rows) for the migrated tables, a target holding fewer rows than its source lost some
+    counts = {}
+    for table in MIGRATED_COLUMNS:
+        if table in SIGHTINGS_TABLES and min(source.schema_version, target.schema_version) < 2:
+            continue
+        counts[table] = tuple([_count_rows(db, table) for db in (source, target)])
+    return counts
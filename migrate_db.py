@@ -0,0 +1,40 @@
+import sys
+
+from job_post_collector.db import DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db, migrate, compare_row_counts
+
+
+# Copies scrolled_jobs, jobs, jd_queue and the job sightings between the MySQL database and the local SQLite file. Run with:
+#   python migrate_db.py                 # MySQL -> SQLite
+#   python migrate_db.py --to-mysql      # SQLite -> MySQL
+mysql_creds = DB_Creds(
+    host = "localhost",
+    port = '3306',
+    user = "local",
+    password = "local",
+    database = "jobs_data"
+)
+sqlite_creds = SQLite_Creds(path="./mount/jobs_data.sqlite3")
+
+
+def main():
+    if "--to-mysql" in sys.argv[1:]:
+        source, target = open_db(sqlite_creds), open_db(mysql_creds)
+    else:
+        source, target = open_db(mysql_creds), open_db(sqlite_creds)
+        
+    copied = migrate(source, target)
+    for table, rows in copied.items():
+        print(f" ||>> {table}: {rows} rows copied")
+        
+    # every row of the source should now be in the target, next to the rows it already had
+    lost = False
+    for table, (source_rows, target_rows) in compare_row_counts(source, target).items():
+        if target_rows < source_rows:
+            print(f" ||>> {table}: only {target_rows} of the {source_rows} source rows in the target")
+            lost = True
+    if lost:
+        sys.exit(1)
+    
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+import argparse
+
+from job_post_collector.db import DB_Creds, SCHEMA_MIGRATIONS
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+
+
+# Applies the pending schema migrations, including the backfills of the new tables from scrolled_jobs.
+# The backfill commits every `--batch-size` rows and records its progress, so the collectors can keep
+# running meanwhile and an interrupted run resumes where it stopped. Run with:
+#   python migrate_schema.py [--sqlite] [--batch-size 5000] [--pause 0.1]
+mysql_creds = DB_Creds(
+    host = "localhost",
+    port = '3306',
+    user = "local",
+    password = "local",
+    database = "jobs_data"
+)
+sqlite_creds = SQLite_Creds(path="./mount/jobs_data.sqlite3")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sqlite", action="store_true", help="migrate the local SQLite file instead of MySQL")
+    parser.add_argument("--batch-size", type=int, default=5000, help="scrolled_jobs rows copied per transaction")
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to wait between batches")
+    args = parser.parse_args()
+    
+    db = open_db(sqlite_creds if args.sqlite else mysql_creds)
+    print(f" ||>> schema version {db.schema_version}, latest {SCHEMA_MIGRATIONS[-1][0]}")
+    version = db.migrate_schema(batch_size=args.batch_size, pause=args.pause)
+    print(f" ||>> schema version {version}")
+    
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+from pathlib import Path
+import json
+import sys
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from job_post_collector.sqlite_db import open_db
+from job_post_collector.search_planner import SearchPlanner
+
+from collect_by_scrolling_jobs import creds
+
+
+# the sightings stored in the last `history_days`
+history_days = 90
+# below this share of jobs found by several searches, the history is taken as missing the known jobs' sightings
+# and no plan is made (`--force` to plan anyway)
+min_shared_fraction = 0.01
+max_jobs = 400
+last_how_many_days = 30
+
+planned_config_file = Path("./search_configs/config_planned.json")
+
+
+def main():
+    db = open_db(creds)
+    
+    planner = SearchPlanner()
+    planner.load_history(db.iter_search_sightings(since=datetime.now() - timedelta(days=history_days)))
+    if not planner.terms:
+        print(" ||>> No search history found")
+        return
+    
+    shared = planner.shared_fraction()
+    if len(planner.terms) > 1 and shared < min_shared_fraction:
+        print(f" ||>> Only {100 * shared:.2f}% of the jobs were found by more than one search: the history seems to record only "
+              f"the first search finding each job, so the overlap can't be measured. Collect again with the current scrollers "
+              f"(they record every search finding a job) or lower `history_days` to those runs.")
+        if "--force" not in sys.argv[1:]:
+            return
+    
+    with pd.option_context("display.max_rows", None, "display.width", 200):
+        print(" ||>> Yield per search:")
+        print(planner.term_stats())
+        
+        overlap = planner.pairwise_overlap()
+        pairs = overlap.stack().rename("overlap").reset_index()
+        pairs = pairs[pairs["level_0"] != pairs["level_1"]].sort_values("overlap", ascending=False)
+        print(" ||>> Most overlapping searches (share of the first one's jobs also found by the second one):")
+        print(pairs.head(20).to_string(index=False))
+        
+    plan = planner.plan()
+    print(" ||>> Plan:")
+    for search in plan:
+        status = f"max_jobs={search.max_jobs(max_jobs)}" if search.keep else "pruned"
+        print(f"    {search.keyword} ({search.location}): {search.marginal}/{search.seen} new jobs, {status}")
+    
+    print(" ||>> Expected savings:")
+    for name, value in planner.savings(plan).items():
+        print(f"    {name}: {value:.1f}" if isinstance(value, float) else f"    {name}: {value}")
+        
+    with open(planned_config_file, 'w') as f:
+        json.dump(planner.to_search_config(plan, last_how_many_days, max_jobs), f, indent=4)
+    print(f" ||>> Planned search config saved to {planned_config_file}")
+    
+if __name__ == "__main__":
+    main()
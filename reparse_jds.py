@@ -0,0 +1,67 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import argparse
+import os
+
+from job_post_collector.jd_getter import JD_GetterConfig, parse_job_html, parse_job_html_full, make_job_data
+from job_post_collector.page_cache import RawPageCache
+from job_post_collector.db import DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+
+
+# Rebuilds the rows of the jobs table from the cached job pages, without any network access. The pages are parsed
+# the same way as by the collector (in full, unless `--fast-parse`), as the rows already stored are overwritten
+page_cache_dir = "./mount/jd_page_cache"
+html_parser = JD_GetterConfig.html_parser
+workers = os.cpu_count()
+write_batch_size = 500
+
+
+def reparse_page(record: dict, fast_parse: bool = JD_GetterConfig.fast_parse):
+    content = RawPageCache(page_cache_dir).get(record["sha256"])
+    job_post, _ = (parse_job_html if fast_parse else parse_job_html_full)(content, html_parser)
+    if job_post is None:
+        return record["job_id"], None
+    return record["job_id"], make_job_data(record["job_id"], record["job_link"], job_post)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--fast-parse", action="store_true", default=JD_GetterConfig.fast_parse,
+                        help="only parse the description and the job criteria list (faster, see JD_GetterConfig.fast_parse)")
+    args = parser.parse_args()
+    
+    # or `SQLite_Creds()` for the local SQLite file
+    creds = DB_Creds(
+        host = "localhost",
+        port = '3306',
+        user = "local",
+        password = "local",
+        database = "jobs_data"
+    )
+    
+    db = open_db(creds)
+    
+    cache = RawPageCache(page_cache_dir)
+    
+    batch = []
+    reparsed, not_found = 0, 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for job_id, job_data in executor.map(partial(reparse_page, fast_parse=args.fast_parse), cache.iter_latest(), chunksize=64):
+            if job_data is None:
+                print(f" ||>> Job post not found in the cached page of {job_id}")
+                not_found += 1
+                continue
+            batch.append(job_data)
+            if len(batch) >= write_batch_size:
+                reparsed += len(batch)
+                db.insert_jobs(batch, on_duplicate="update")
+                batch = []
+        if batch:
+            reparsed += len(batch)
+            db.insert_jobs(batch, on_duplicate="update")
+            
+    print(f" ||>> Re-parsed {reparsed} job posts ({not_found} cached pages without a job post)")
+    
+if __name__ == "__main__":
+    main()
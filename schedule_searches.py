@@ -0,0 +1,84 @@
+from pathlib import Path
+import json
+import logging
+from datetime import datetime
+
+from job_post_collector.job_scroller import SearchConfig, get_chrome_driver
+from job_post_collector.sqlite_db import open_db
+from job_post_collector.known_jobs import KnownJobsIndex
+from job_post_collector.driver_pool import ChromeDriverPool
+from job_post_collector.scheduler import ScheduledSearch, SearchScheduler, WatermarkStore
+from job_post_collector.metrics import MetricsExporter
+
+from collect_by_scrolling_jobs import creds, backend, max_browsers, recycle_browser_after, browser_profile, make_scroller
+
+
+# the searches of the monthly config, each one re-run every `interval_hours` (if set in the config) or `default_interval_hours`,
+# asking only for the postings since its last successful run (at most `last_how_many_days` back)
+search_config_file = Path("./search_configs/config_1_monthly.json")
+default_interval_hours = 24
+
+watermarks_file = Path("./mount/scheduler/watermarks.json")
+# a port of its own, so that it can run next to the other collection scripts
+metrics_port = 9111
+metrics_snapshot_file = Path("./mount/metrics/schedule_searches.json")
+
+
+def make_search_config(search: ScheduledSearch, window_seconds: int, **kwargs) -> SearchConfig:
+    # a run goes on through the jobs other searches already found, so that it reaches the end of its window
+    # and moves the watermark (stopping on stale batches would cut nearly every run short)
+    return SearchConfig(
+        search_id=f"{search.search_term}_{search.location}_{datetime.now().strftime('%Y-%m-%d_%H-%M')}",
+        Keywords=search.search_keyword,
+        Location=search.location,
+        Time=window_seconds,
+        max_jobs=search.max_jobs,
+        stop_after_stale_batches=0,
+        **kwargs
+    )
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    
+    db = open_db(creds)
+    known_jobs = KnownJobsIndex.from_db(db)
+    print(f" ||>> Loaded {len(known_jobs)} already collected job ids")
+    
+    with open(search_config_file, 'r') as f:
+        search_config = json.load(f)
+        
+    searches = [
+        ScheduledSearch(
+            search_term=config["search_term"],
+            location=config["location"],
+            interval_hours=config.get("interval_hours", default_interval_hours),
+            max_window_days=config["last_how_many_days"],
+            max_jobs=config.get("max_jobs", SearchConfig.max_jobs)
+        )
+        for config in search_config["searches"]
+    ]
+    
+    driver_pool = ChromeDriverPool(lambda: get_chrome_driver(browser_profile), size=max_browsers, recycle_after=recycle_browser_after)
+    
+    def run_search(search: ScheduledSearch, window_seconds: int) -> str:
+        config = make_search_config(search, window_seconds, backend=backend, browser_profile=browser_profile)
+        Scroller = make_scroller(config, known_jobs, driver_pool)
+        Scroller.run()
+        return Scroller.outcome
+    
+    # as many searches at a time as there are browsers
+    scheduler = SearchScheduler(searches, run_search, WatermarkStore(watermarks_file),
+                                last_seen=lambda search: db.get_last_sighting(search.search_keyword, search.location),
+                                max_concurrent=max_browsers)
+    exporter = MetricsExporter(port=metrics_port, snapshot_file=metrics_snapshot_file).start()
+    try:
+        scheduler.run_forever()
+    except KeyboardInterrupt:
+        print(" ||>> Stopping, waiting for the running searches to finish")
+    finally:
+        driver_pool.close()
+        exporter.stop()
+    
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import argparse
+
+from job_post_collector.db import DB_Creds
+from job_post_collector.sqlite_db import SQLite_Creds, open_db
+
+
+# Full-text search over the collected job descriptions (the index is built by `migrate_schema.py`). Run with e.g.:
+#   python search_jobs.py 'python (spark OR hadoop) -java "machine learning"' --location Bengaluru --seniority "Mid-Senior level"
+mysql_creds = DB_Creds(
+    host = "localhost",
+    port = '3306',
+    user = "local",
+    password = "local",
+    database = "jobs_data"
+)
+sqlite_creds = SQLite_Creds(path="./mount/jobs_data.sqlite3")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("query", help='terms are required, `a OR b` / `(a b)` needs any of them, `-term` excludes, "quoted phrases", pyth* prefixes')
+    parser.add_argument("--keyword", help="only the jobs found by this search term")
+    parser.add_argument("--location", help="only the jobs whose location contains this text")
+    parser.add_argument("--seniority", help="only the jobs with this seniority level, e.g. 'Entry level'")
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--sqlite", action="store_true", help="search the local SQLite file instead of MySQL")
+    args = parser.parse_args()
+    
+    db = open_db(sqlite_creds if args.sqlite else mysql_creds)
+    matches = db.search_jobs(args.query, search_keyword=args.keyword, location=args.location,
+                             seniority_level=args.seniority, limit=args.limit)
+    for match in matches:
+        print(f"{match.score:8.3f}  {match.job_id}  {match.seniority_level}  {match.job_link}")
+    print(f" ||>> {len(matches)} jobs")
+    
+if __name__ == "__main__":
+    main()